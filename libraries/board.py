@@ -75,6 +75,9 @@ class PieceType:
 
     SLIDING_PIECES = [ROOK,QUEEN,BISHOP]
 
+    VALUES = [100,320,330,500,900,10000]
+    """Piece values in centi pawns indexed by piece type, shared by evaluation and static exchange evaluation - https://www.chessprogramming.org/Simplified_Evaluation_Function"""
+
     STRING_ABREVIATIONS = {"p":PAWN,"n":KNIGHT,"b":BISHOP,"r":ROOK,"k":KING,"q":QUEEN}
     NUMBER_REPRESENTATIONS = {PAWN:"p", KNIGHT:"n", BISHOP:"b", ROOK:"r", KING:"k", QUEEN:"q"}
 
@@ -112,6 +115,17 @@ class BitTwiddle:
         assert bb.value != 0
         index = c_uint64(((bb.value & -bb.value) * BitTwiddle.debruijconst.value)).value >> 58
         return BitTwiddle.lookup_table[index]
+
+    @staticmethod
+    def lsb(value:int)->int:
+        """Index of least significant bit of a raw bitboard value, value must not be 0"""
+        return (value & -value).bit_length() - 1
+
+    @staticmethod
+    def msb(value:int)->int:
+        """Index of most significant bit of a raw bitboard value, value must not be 0"""
+        return value.bit_length() - 1
+
 class HashUtil(ABC):
     """Hashing utility abstrcact class"""
     @abstractmethod
@@ -627,11 +641,13 @@ class BoardIO:
 
         #Set enpassant targets, "-" -> no en passant target
         pas_str = split_str[3]
-        #TODO Implement
         if pas_str == "-":
             board.enpassant_target = None
         else:
-            board.enpassant_target = Bitboard.get_pos(*BoardIO.convert_position(pas_str))
+            #FEN gives the capture square, board stores the position of the pawn that is capturable via enpassant
+            #White to move - black pawn is one rank below capture square -> + shift
+            shift = 8 if board.turn == PieceColor.WHITE else -8
+            board.enpassant_target = Bitboard.get_pos(*BoardIO.convert_position(pas_str)) + shift
         
         if len(split_str) == 6:
             #Try to parse half move / full move. Not always included
@@ -0,0 +1,281 @@
+import argparse
+import heapq
+import logging
+import os
+import re
+import shutil
+import struct
+import tempfile
+from multiprocessing import Pool
+from openingbook import *
+
+class PGNReader:
+    """
+    Streams games from a PGN file one at a time so arbitrarily large collections can be read. \n
+    Comments, variations, NAGs and move numbers are skipped, only the main line is returned
+    """
+
+    RE_HEADER = re.compile(r'\[(\w+)\s+"(.*)"\]')
+    RE_MOVE_NUMBER = re.compile(r"^\d+\.+")
+    RESULTS = ("1-0","0-1","1/2-1/2","*")
+
+    PROMOTION_TYPES = {"n":MoveType.PROMOTIONKNIGHT,"b":MoveType.PROMOTIONBISHOP,"r":MoveType.PROMOTIONROOK,"q":MoveType.PROMOTIONQUEEN}
+    """SAN promotion piece -> our promotion move type"""
+
+    @staticmethod
+    def games(path:str):
+        """Generator of (headers, san moves) for every game in the file"""
+        headers = {}
+        moves = []
+        #Nesting depth of variations, and whether we are inside a {} comment
+        variation = 0
+        comment = False
+
+        with open(path,"r",encoding="utf-8",errors="replace") as file:
+            for line in file:
+                line = line.strip()
+                if not comment and variation == 0 and line.startswith("["):
+                    #A header after movetext starts a new game
+                    if len(moves) > 0:
+                        yield headers, moves
+                        headers = {}
+                        moves = []
+                    match = PGNReader.RE_HEADER.match(line)
+                    if match != None:
+                        headers[match.group(1)] = match.group(2)
+                    continue
+
+                for token in PGNReader.__tokens(line):
+                    if comment:
+                        if token == "}": comment = False
+                        continue
+                    if token == "{":
+                        comment = True
+                    elif token == ";":
+                        break
+                    elif token == "(":
+                        variation += 1
+                    elif token == ")":
+                        variation = max(variation - 1,0)
+                    elif variation > 0 or token.startswith("$"):
+                        continue
+                    elif token in PGNReader.RESULTS:
+                        headers.setdefault("Result",token)
+                        yield headers, moves
+                        headers = {}
+                        moves = []
+                    else:
+                        token = PGNReader.RE_MOVE_NUMBER.sub("",token)
+                        if token != "": moves.append(token)
+
+        if len(moves) > 0:
+            yield headers, moves
+
+    @staticmethod
+    def __tokens(line:str)->list[str]:
+        """Splits movetext line, brackets and comment markers are separate tokens"""
+        for char in "{}();":
+            line = line.replace(char,f" {char} ")
+        return line.split()
+
+    @staticmethod
+    def san_to_move(move_engine:MoveEngine,san:str)->Move:
+        """Finds the legal move matching the SAN string, returns None if no move matches"""
+        san = san.rstrip("+#!?")
+
+        if san in ("O-O","0-0"):
+            return next((move for move in move_engine.get_moves() if move.move_type == MoveType.CASTLERIGHT),None)
+        if san in ("O-O-O","0-0-0"):
+            return next((move for move in move_engine.get_moves() if move.move_type == MoveType.CASTLELEFT),None)
+
+        #Promotion piece
+        promotion = None
+        if "=" in san:
+            san, promotion = san.split("=")
+            promotion = PGNReader.PROMOTION_TYPES.get(promotion.lower())
+        elif len(san) > 2 and san[-1] in "NBRQ" and san[-2].isdigit():
+            promotion = PGNReader.PROMOTION_TYPES.get(san[-1].lower())
+            san = san[:-1]
+
+        piece = PieceType.PAWN
+        if san[0] in "NBRQK":
+            piece = PieceType.STRING_ABREVIATIONS[san[0].lower()]
+            san = san[1:]
+        san = san.replace("x","")
+        if len(san) < 2: return None
+
+        try:
+            pos_to = BoardIO.convert_position_bit(san[-2:])
+        except (KeyError,ValueError):
+            return None
+        #Remaining characters disambiguate origin file and/or rank
+        disambiguation = san[:-2]
+
+        for move in move_engine.get_moves():
+            if move.piece != piece or move.pos_to != pos_to: continue
+            if move.move_type in MoveType.CASTLES: continue
+            if move.move_type in MoveType.PROMOTIONS and move.move_type != promotion: continue
+            origin = BoardIO.to_standard_coords(move.pos_from)
+            if any(char not in origin for char in disambiguation): continue
+            return move
+        return None
+
+class BookBuilder:
+    """
+    Builds polyglot opening book from PGN files. \n
+    Games are split between worker processes. Each worker replays its games with MoveEngine and
+    aggregates (key, move) weights in memory, when the table grows past max_entries it is written to disk as a run sorted by key. \n
+    Runs of all workers are merged in key order and written as a sorted polyglot book, so memory use is bounded regardless of collection size
+    """
+
+    RUN_FORMAT = struct.Struct(">QHI")
+    """Run record - key (uint64), move (uint16), weight (uint32)"""
+
+    RUN_READ_RECORDS = 4096
+    """Records read from a run file at a time during merging"""
+
+    WEIGHT_WIN = 2
+    WEIGHT_DRAW = 1
+    WEIGHT_LOSS = 0
+
+    max_ply:int = 30
+    """Only moves up to this ply of each game are added to the book"""
+
+    min_weight:int = 1
+    """Entries with total weight less than this are dropped"""
+
+    max_entries:int = 1000000
+    """Max (key, move) pairs a worker holds in memory before writing a run"""
+
+    processes:int = None
+    """Worker process count, defaults to cpu count"""
+
+    def __init__(self,max_ply:int = 30,min_weight:int = 1,max_entries:int = 1000000,processes:int = None) -> None:
+        self.max_ply = max_ply
+        self.min_weight = min_weight
+        self.max_entries = max_entries
+        self.processes = processes if processes != None else os.cpu_count()
+
+    def build(self,paths:list[str],output:str):
+        """Builds book at output path from the given PGN files"""
+        run_dir = tempfile.mkdtemp(prefix="book_runs_")
+        try:
+            tasks = [(paths,worker,self.processes,run_dir) for worker in range(self.processes)]
+            with Pool(self.processes) as pool:
+                runs = [run for worker_runs in pool.map(self._replay_games,tasks) for run in worker_runs]
+            logging.info(f"Merging {len(runs)} runs")
+            entries = self.__write_book(runs,output)
+            logging.info(f"Wrote {entries} entries to {output}")
+        finally:
+            shutil.rmtree(run_dir,ignore_errors=True)
+
+    def _replay_games(self,task:tuple)->list[str]:
+        """Worker, replays every game with index = worker (mod workers) and returns paths of the runs written"""
+        paths, worker, workers, run_dir = task
+        cache = MoveCache(polyglot_keys=True)
+        move_engine = MoveEngine(BoardIO.from_fen(FEN.START_POS),cache)
+        #Games often continue past a claimable draw
+        move_engine.can_draw = False
+
+        weights:dict[tuple[int,int],int] = {}
+        runs = []
+        index = 0
+        for path in paths:
+            for headers, moves in PGNReader.games(path):
+                index += 1
+                if index % workers != worker: continue
+                self.__replay_game(move_engine,headers,moves,weights)
+                if len(weights) >= self.max_entries:
+                    runs.append(self.__write_run(weights,run_dir,worker,len(runs)))
+                    weights.clear()
+
+        if len(weights) > 0:
+            runs.append(self.__write_run(weights,run_dir,worker,len(runs)))
+        return runs
+
+    def __replay_game(self,move_engine:MoveEngine,headers:dict,moves:list[str],weights:dict[tuple[int,int],int]):
+        result = headers.get("Result")
+        if result == "1-0":
+            results = {PieceColor.WHITE:self.WEIGHT_WIN,PieceColor.BLACK:self.WEIGHT_LOSS}
+        elif result == "0-1":
+            results = {PieceColor.WHITE:self.WEIGHT_LOSS,PieceColor.BLACK:self.WEIGHT_WIN}
+        elif result == "1/2-1/2":
+            results = {PieceColor.WHITE:self.WEIGHT_DRAW,PieceColor.BLACK:self.WEIGHT_DRAW}
+        else:
+            return
+
+        try:
+            move_engine.set_fen(headers.get("FEN",FEN.START_POS))
+        except (ValueError,IndexError):
+            return
+
+        try:
+            for san in moves[:self.max_ply]:
+                move = PGNReader.san_to_move(move_engine,san)
+                #Stop at first move that can not be read
+                if move == None: return
+                entry = (move_engine.current_hash,OpeningBook.encode(move))
+                weights[entry] = weights.get(entry,0) + results[move_engine.board.turn]
+                move_engine.move(move)
+        finally:
+            #Worker replays every game on one engine, nothing of this game may be kept
+            move_engine.unwind(0)
+
+    def __write_run(self,weights:dict[tuple[int,int],int],run_dir:str,worker:int,run:int)->str:
+        path = os.path.join(run_dir,f"run_{worker}_{run}.bin")
+        with open(path,"wb") as file:
+            for (key, raw_move) in sorted(weights):
+                file.write(self.RUN_FORMAT.pack(key,raw_move,weights[(key,raw_move)]))
+        return path
+
+    def __read_run(self,path:str):
+        """Generator of (key, move, weight) records of a run"""
+        size = self.RUN_FORMAT.size
+        with open(path,"rb") as file:
+            while True:
+                data = file.read(size*self.RUN_READ_RECORDS)
+                if len(data) == 0: break
+                yield from self.RUN_FORMAT.iter_unpack(data)
+
+    def __write_book(self,runs:list[str],output:str)->int:
+        """Merges runs into polyglot book, returns number of entries written"""
+        count = 0
+        with open(output,"wb") as file:
+            key = None
+            moves:dict[int,int] = {}
+            for record_key, raw_move, weight in heapq.merge(*[self.__read_run(run) for run in runs]):
+                if record_key != key:
+                    count += self.__write_position(file,key,moves)
+                    key = record_key
+                    moves = {}
+                moves[raw_move] = moves.get(raw_move,0) + weight
+            count += self.__write_position(file,key,moves)
+        return count
+
+    def __write_position(self,file,key:int,moves:dict[int,int])->int:
+        """Writes book entries of a position, best moves first. Weights are scaled down to fit polyglot 16 bit weights"""
+        moves = {raw_move:weight for raw_move, weight in moves.items() if weight >= self.min_weight}
+        if len(moves) == 0: return 0
+
+        scale = max(moves.values()) / 0xFFFF
+        for raw_move, weight in sorted(moves.items(),key=lambda entry: -entry[1]):
+            if scale > 1:
+                weight = max(int(weight / scale),1)
+            file.write(OpeningBook.ENTRY_FORMAT.pack(key,raw_move,weight,0))
+        return len(moves)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Build polyglot opening book from PGN files")
+    parser.add_argument("pgn",nargs="+",help="PGN files to read")
+    parser.add_argument("-o","--output",default="opening/book.bin",help="Path of book to write")
+    parser.add_argument("--max-ply",type=int,default=30,help="Only moves up to this ply are added")
+    parser.add_argument("--min-weight",type=int,default=1,help="Drop entries with lower total weight")
+    parser.add_argument("--max-entries",type=int,default=1000000,help="Entries a worker keeps in memory before writing a run")
+    parser.add_argument("-p","--processes",type=int,default=None,help="Worker processes, defaults to cpu count")
+    args = parser.parse_args()
+
+    builder = BookBuilder(args.max_ply,args.min_weight,args.max_entries,args.processes)
+    builder.build(args.pgn,args.output)
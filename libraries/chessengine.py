@@ -1,4 +1,4 @@
-from copy import deepcopy
+import math
 from moveengine import *
 from evaluation import *
 import time
@@ -6,113 +6,11 @@ import pstats
 from pstats import SortKey
 import time
 from test import *
-import chess
-import chess.polyglot
+from openingbook import *
+from transposition import *
+from timemanager import *
 import logging
 
-class Node:
-    """Rerpresents a node in alphabeta search"""
-    best_node:"Node" = None
-
-    move:Move = None
-    
-    best_move:Move = None
-    
-    score:int = None
-    
-    quiescence:bool = None
-    
-    beta_cut:bool = False
-
-    transposition_read:bool = False
-
-    def __init__(self,move:Move,best_move:Move,score:int,quiescence:bool,beta_cut:bool = False) -> None:
-        self.move = move
-        self.best_move = best_move
-        self.score = score
-
-        self.quiescence = quiescence
-        self.beta_cut = beta_cut
-
-    def __repr__(self) -> str:
-        output = "Node object: "
-        if self.move != None:
-            output += f"Representing move: {self.move.uci}, "
-        if self.best_move != None:
-            output += f" best move found: {self.best_move.uci}, "
-        else:
-            output += "No move yet asigned, "
-        output += f"score: {self.score} "
-        if self.quiescence:
-            output += ", quiescence node"
-        output += f", beta cut: {self.beta_cut}"
-        return output
-
-
-class TranspositionTable:
-    table_depth = 4
-    __tables = None
-
-    def add_entry(self,hash:int,depth_left:int,node:Node,alpha:int,beta:int):
-        """Add entry to transposition table"""
-        #Look at most recent table
-        table = self.__tables[-1]
-        
-
-        #Add entry to our table if if the hash at the table has depth left of less than our current depth
-        add = False
-        if not hash in table:
-            add = True
-        elif table[hash][0] < depth_left:
-            add = True
-                
-        if add:
-            table[hash] = (depth_left,node)
-    
-
-    def attempt_read(self,hash:int,depth_left:int)->Node:
-        """
-        Reads entry from transposition table that corresponds to given hash if it exists and has a depth greater than or equal to depth left.
-        If entry does not exist returns None. If entry exists returns (score,depth_left,c_nodes) for entry
-        """
-        #look through all our tables
-        tables = self.__tables
-        
-        #Start at newest tables first
-        for table in reversed(tables):
-            #Look for hash in our table
-            if hash in table:
-                #Hash is in table, ensure a
-                entry = table[hash]
-                #Only read from table if it meets the depth specification
-                if entry[0] >= depth_left:
-                    return entry[1]
-        #No entry found that meets depth specification return none
-        return None
-
-    
-    def advance_turn(self):
-        """Clears out old transpositions, prepares for new turn"""
-        self.__tables.append({})
-        self.__purge()
-
-    def __purge(self):
-        """Adds new transposition tables, trims transposition tables until they match the table depth"""
-        while(1):
-            if len(self.__tables) >= self.table_depth:
-                del self.__tables[0]
-            else:
-                break
-
-
-
-
-    def __init__(self,table_count:int = 2) -> None:
-        self.__tables = [{}]
-        self.table_depth = table_count
-
-
-
 class Engine():
 
     MAXDEPTH = 50
@@ -123,12 +21,33 @@ class Engine():
 
     presort = True
 
-    select = None
     nodes = 0
-    evaluations = []
 
-    null_depth = 3
-    table_depth = 4
+    NULL_MIN_DEPTH:int = 2
+    """Null moves are tried at nodes with at least this much depth left"""
+    NULL_REDUCTION:int = 2
+    NULL_REDUCTION_DIVISOR:int = 4
+    """Null move search is reduced by NULL_REDUCTION + depth left // NULL_REDUCTION_DIVISOR plies"""
+    NULL_VERIFY_PIECES:int = 1
+    """Null move cutoffs are verified if the side to move has at most this many pieces other than pawns, or in the endgame"""
+
+    hash_mb:int = 16
+    """Size of transposition table in MB"""
+
+    depth_reached:int = 0
+    """Deepest iteration completed by last ponder"""
+
+    depth_offset:int = 0
+    """Added to the depth of every ponder iteration after the first, lets parallel helpers search at different depths"""
+
+    smp_helper:bool = False
+    """Set on helper engines of a parallel search, and on the main engine while a parallel search runs it, such engines do not advance the transposition table generation"""
+
+    stop_flag = None
+    """Shared flag (e.g. multiprocessing.RawValue), ponder stops when its value is set"""
+
+    log_search:bool = True
+    """Log depth, score and statistics of every ponder, helpers of a parallel search turn it off so only the main search reports"""
 
     ALPHA_DEF:int = -100000000
     BETA_DEF:int = 100000000
@@ -136,37 +55,136 @@ class Engine():
     KEY_W_PROMO:int = 900
     KEY_W_ENPASSANT:int = 200
     KEY_W_KING_ATTACK:int = 50
+    KEY_W_CAPTURE:int = 300
+    KEY_W_PV:int = 30000
+    """Move of the principal variation of the last iteration, searched before the hash move"""
+    KEY_W_HASH:int = 20000
+    KEY_W_KILLER:int = 200
+    KEY_W_HISTORY:int = 75
+    """Weight of a quiet move with maximum history score"""
+    KEY_W_QUIET_MAX:int = KEY_W_CAPTURE - 1
+    """Killer and history weights of a quiet move together stay below an even capture"""
+
+    KILLER_SLOTS:int = 2
+    HISTORY_MAX:int = 256
+    """History is aged once a score reaches this"""
+
+    killers:list[list[int]] = None
+    """Packed quiet moves that caused beta cutoffs, per ply from root"""
+    history:list[list[list[int]]] = None
+    """History scores of quiet moves [color][from][to]"""
 
     transpositions_read = 0
 
+    ASPIRATION_WINDOW:int = 50
+    """Half width of first aspiration window"""
+    ASPIRATION_GROWTH:int = 4
+    """Window half width is multiplied by this after a fail"""
+    ASPIRATION_MAX:int = 2000
+    """Once half width reaches this the failing side is opened fully"""
+
+    aspiration_searches:int = 0
+    """Root searches made by aspiration windows during last ponder"""
+    aspiration_fail_low:int = 0
+    aspiration_fail_high:int = 0
+
+    LMR_MIN_DEPTH:int = 3
+    """Moves are only reduced with at least this much depth left"""
+    LMR_MIN_MOVES:int = 3
+    """Moves searched at full depth before reductions start"""
+    LMR_BASE:float = 0.75
+    LMR_DIVISOR:float = 2.25
+    """Reduction of the n th move at depth d is LMR_BASE + ln(d) * ln(n) / LMR_DIVISOR plies"""
+
+    lmr_table:list[list[int]] = None
+    """Reductions [depth left][move number]"""
+
+    PRUNING_DEPTH:int = 3
+    """Static evaluation is computed for pruning at nodes with at most this much depth left"""
+    FUTILITY_MARGINS:list[int] = [0,200,300,500]
+    """[depth left] Quiet moves are skipped if static evaluation plus margin can not reach alpha"""
+    REVERSE_FUTILITY_MARGIN:int = 120
+    """Per ply of depth left, node fails high if static evaluation minus margin is still at least beta"""
+    RAZOR_MARGINS:list[int] = [0,300,550]
+    """[depth left] Node drops into quiescence if static evaluation plus margin is below alpha"""
+
+    futility_prunes:int = 0
+    reverse_futility_prunes:int = 0
+    razor_prunes:int = 0
+
+    MAX_PLY:int = 2 * MAXDEPTH + 2
+    """Longest path from the root the search reaches, depth plus extensions"""
+    MATE_PLY_WEIGHT:int = 1000
+    """Mate scores fall by this per ply between the root and the checkmate"""
+    mate_distance_prunes:int = 0
+
+    MAX_EXTENSIONS:int = 4
+    """Extensions allowed on one path from the root, also limited by the depth of the iteration"""
+    SINGULAR_MIN_DEPTH:int = 4
+    """Singular extensions are tested at nodes with at least this much depth left"""
+    SINGULAR_ENTRY_DEPTH:int = 3
+    """Transposition entry of the hash move may be at most this much shallower than the node"""
+    SINGULAR_MARGIN:int = 20
+    """Per ply of depth left, other moves must stay this far below the hash move score for it to be singular"""
+
+    check_extensions:int = 0
+    singular_extensions:int = 0
+    singular_searches:int = 0
+
+    lmr_reductions:int = 0
+    """Moves searched with reduced depth in the current iteration"""
+    lmr_researches:int = 0
+    """Reduced searches that beat alpha and were searched again at full depth"""
+
+    pvs_searches:int = 0
+    """Null window searches of the current iteration"""
+    pvs_researches:int = 0
+    """Null window searches that failed high and were searched again with full window"""
+
     PATH_OPENING = "opening/baron30.bin"
     """Path to opening book"""
     
     opening_book_mode:bool = True
     """If set to true will attempt to probe opening book"""
 
+    opening_book_weighted:bool = True
+    """If set to true book moves are picked at random by weight, otherwise the highest weighted move is played"""
+
+    opening_book:OpeningBook = None
+
     __is_endgame:bool = False
 
-    __depth_left:int = 0
     __c_depth:int = 0
 
-    __last_ponder:Node = None
+    pv:list[Move] = None
+    """Principal variation (best line) found by the last completed search"""
+    pv_table:list[list[Move]] = None
+    """Triangular PV table https://www.chessprogramming.org/Triangular_PV-Table - pv_table[ply] holds the best line from ply"""
+    pv_length:list[int] = None
+    """pv_table[ply] holds moves ply to pv_length[ply] - 1"""
+    __pv_root:int = 0
+    """Hash of the position pv was found from"""
+    __pv_following:list[bool] = None
 
-    __pondering:bool = False
-    __t_start:float = None
-    __t_ponder:float = None
+    time_manager:TimeManager = None
 
-    __p_wieghts_used = 0
+    __pondering:bool = False
+    __poll_countdown:int = 0
+    __root_score:int = 0
+    """Score of the best root move of the running iteration"""
+    __root_window:tuple[int,int] = (ALPHA_DEF,BETA_DEF)
+    """Alpha and beta of the running root search, root scores outside it are only bounds"""
 
-    __folowing_left = False
-    __left_node:Node = None
-    __left_depth = 0
     __null_move_prunes = 0
+    null_verifications:int = 0
+    """Null move cutoffs checked by a verification search in the current iteration"""
     __node_count = 0
 
     debug = True
 
     transposition_table:TranspositionTable = None
+
+    __book_cache:MoveCache = None
     
     @property
     def board(self):
@@ -180,10 +198,12 @@ class Engine():
         pass
 
     def __check_stop(self):
-        if self.__pondering:
-            c_time = time.time()
-            if c_time - self.__t_start > self.__t_ponder:
-                raise Engine.TimeUpException("Time ran out on computation")
+        #Clock is only read every POLL_NODES nodes
+        self.__poll_countdown -= 1
+        if self.__poll_countdown > 0: return
+        self.__poll_countdown = TimeManager.POLL_NODES
+        if self.__pondering and self.time_manager.poll():
+            raise Engine.TimeUpException("Time ran out on computation")
 
     def presort_key(self,move:Move):
         """The key for presorting moves for efficient alpha beta search"""
@@ -194,68 +214,19 @@ class Engine():
 
         weight = 0
 
-        if self.__pondering and self.__c_depth == self.__depth_left:
-            self.__folowing_left = True
-
-
-
-        if self.__pondering and self.__folowing_left:
-
-            #Follow best move from last ponder to just above the horizon
-
-            if self.__depth_left == 1:
-                self.__folowing_left = False
-            
-            if self.__left_node == None or self.__left_node.best_move == None:
-                self.__folowing_left = False
-
-            if self.__folowing_left and self.__depth_left < self.__left_depth:
-                move_id = move.id
-                if move_id == self.__left_node.best_move.id:
-                    weight = 10000 
-                    self.__left_node = self.__left_node.best_node
-                    self.__p_wieghts_used += 1
-                    self.__left_depth = self.__depth_left
-                    return weight
-
-            if self.__c_depth == self.__depth_left and self.__last_ponder != None:
-                move_id = move.id
-                if move_id == self.__last_ponder.best_move.id:
-                    weight = 10000
-                    self.__folowing_left = True
-                    self.__left_node = self.__last_ponder.best_node
-                    self.__p_wieghts_used += 1
-                    self.__left_depth = self.__c_depth
-
-                    return weight
-
         #Reward promotion, if we can do it good change we should
         if move.move_type in MoveType.PROMOTIONS : weight += self.KEY_W_PROMO
 
 
-        #Attempt to read score from transposition table
-        #hash = ChessHashing.update(self.move_engine.current_hash,self.cache,move,self.board)
-        #entry = self.transposition_table.attempt_read(hash,self.__depth_left - 1)
-#
-        #if entry != None:
-        #    if entry[3].beta_cut:
-        #        return 2000
-
         #reward enpassant
         if move.move_type == MoveType.ENPASSANT: weight += self.KEY_W_ENPASSANT
 
 
-        piece_weight = Evaluation.PIECE_WIEGHTS_BASIC_KING[move.piece]
-        if move.capture and move.piece != PieceType.KING:
-            #Weight looking at any captures
-           
-            
-            if not self.__is_bad_capture(move):
-                if move.piece != PieceType.KING:
-                    dif_weight = piece_weight - Evaluation.PIECE_WIEGHTS_BASIC[move.capure_piece]
-                else:
-                    dif_weight = Evaluation.PIECE_WIEGHTS_BASIC[move.capure_piece]
-                weight += dif_weight if dif_weight > 0 else 50
+        if move.capture:
+            #Weight captures by static exchange evaluation, winning and even captures are tried before quiet moves
+            #losing captures are tried after them
+            see = self.move_engine.see(move)
+            weight += self.KEY_W_CAPTURE + see if see >= 0 else see
 
         pos_tbl = PST.get_table(turn,move.piece,self.__is_endgame)
 
@@ -270,7 +241,7 @@ class Engine():
         return weight
 
         
-    def quiescence(self,alpha:int,beta:int,depth:int,p_move:Move)->Node:
+    def quiescence(self,alpha:int,beta:int,depth:int,p_move:Move)->int:
         """
         Called at horizon nodes, evaluates captures until no captures are left
         Esentially just alpha beta search for captures
@@ -279,10 +250,14 @@ class Engine():
         #Check if we still have time
         self.__check_stop()
 
-        score = Evaluation.evaluate(self.move_engine,alpha,beta,depth == 0,self.__is_endgame)
+        #Checkmate is tested for at the first quiescence node and scored by distance from root like checkmates found in alphabeta
+        if depth == 0 and self.move_engine.in_checkmate():
+            score = -self.mate_score(len(self.move_engine.move_stack) - self.__root_ply)
+        else:
+            score = Evaluation.evaluate(self.move_engine,alpha,beta,self.__is_endgame)
         if score >= beta:
             #Beta cutoff
-            return Node(p_move,MoveProcessor.NULL_MOVE,score=beta,quiescence=True,beta_cut=True)
+            return beta
 
         #Delta Pruning
         #https://www.chessprogramming.org/Delta_Pruning#:~:text=Delta%20Pruning%2C,alpha%20for%20the%20current%20node.
@@ -291,143 +266,145 @@ class Engine():
             delta += 775
 
         if score < alpha - delta:
-            return Node(p_move,MoveProcessor.NULL_MOVE,score=alpha,quiescence=True,beta_cut=False)
+            return alpha
 
 
         #Capture search
 
         if score > alpha:
             alpha = score
-        
-        c_node = Node(p_move,best_move=MoveProcessor.NULL_MOVE, score=None, quiescence=True, beta_cut=False)
 
         def loop_captures(move:Move):
-            nonlocal alpha,beta,c_node
+            nonlocal alpha,beta
 
-            if self.__is_bad_capture(move): 
-                #Bad capture keep searching
-                return True
-            
             #Alpha beta search for capture
-            sub_node = self.quiescence(-beta,-alpha,depth + 1,move)
-            score = -sub_node.score
+            score = -self.quiescence(-beta,-alpha,depth + 1,move)
 
             if score >= beta:
                 #Beta cutoff
-                c_node.best_move = move
-                c_node.beta_cut = True
-                c_node.best_node = sub_node
                 alpha = beta
                 return False
             
             if score > alpha:
-                c_node.best_move = move
-                c_node.best_node = sub_node
                 alpha = score          
 
             return True
         
+        #Static exchange evaluation of every capture, computed once when filtering and reused to sort
+        see_scores = {}
         def allow(move:Move)->bool:
-            return move.capture
-        #Loop through captures, TODO need move generator that only generates captures
-        self.move_engine.loop_moves(loop_captures,None,allow)
-
-        c_node.score = alpha
-
-        return c_node
-
-    def __is_bad_capture(self,move:Move):
-        """Static capture evaluation, to determine if capture is good or not"""
+            if not move.capture: return False
+            see = self.move_engine.see(move)
+            see_scores[move.id] = see
+            #Prune captures that lose material according to static exchange evaluation
+            return see >= 0
+        #Loop through captures best exchange first, TODO need move generator that only generates captures
+        self.move_engine.loop_moves(loop_captures,lambda move: see_scores[move.id],allow)
 
-        #Capturing with pawn always good
-        if move.piece == PieceType.PAWN:
-            return False
-        #Capturing to increase value good
-        if Evaluation.PIECE_WIEGHTS_BASIC_KING[move.piece] <= Evaluation.PIECE_WIEGHTS_BASIC_KING[move.capure_piece] + 200:
-            return False
-
-        #Piece weight is less than captured piece, if captured piece is defended by pawn abort
-        if self.__is_defended_by_pawn(move.caputre_pos,PieceColor.reverse_color(self.board.turn)):
-            return True
+        return alpha
 
-        return False 
-
-    def __is_defended_by_pawn(self,pos,color):
-        """Returns true if the position is defended by a pawn of given color"""
-        pawn_board = self.board.get_board_piece(color,PieceType.PAWN)
-        #Check if a pawn is defending by seing if a pawn placed at that square of oposite color could capture another pawn
-        mask = self.cache.bitm_moves_p_a_b[pos] if color == PieceColor.WHITE else self.cache.bitm_moves_p_a_w[pos]
-        return (pawn_board.value & mask.value) == 0
-        
-    def __null_evaluation(self,depth_left:int,alpha:int,beta:int,p_move:Move)->bool:        
-        """Attempt evaluation of null move returns True if null move triggered a beta cutoff false if otherwise"""
+    def __null_evaluation(self,depth_left:int,alpha:int,beta:int,p_move:Move,extensions:int,ply:int)->bool:        
+        """
+        Attempt evaluation of null move returns True if null move triggered a beta cutoff false if otherwise \n
+        https://www.chessprogramming.org/Null_Move_Pruning
+        """
         
         me = self.move_engine
-        #No null moves on first loop
-        if depth_left == self.__c_depth:
-            return False
-        #No null moves in endgame, for now
-        if self.__is_endgame:
+        #No null moves at the root
+        if ply == 0:
             return False
         #No null moves when king is in check 
         if me.in_check:
             return False
+        #Too shallow for a reduced search to be cheaper than searching moves
+        if depth_left < self.NULL_MIN_DEPTH:
+            return False
+        #Failing high on a mate score can not be proven by passing
+        if abs(beta) >= Evaluation.WEIGHT_CHECKMATE:
+            return False
 
-        if depth_left > self.null_depth:
+        #Without pieces other than pawns every move may worsen our position (zugzwang), passing is not an option then
+        color = self.turn
+        board = me.board
+        pieces = sum(board.get_piece_count(color,piece_type) for piece_type in (PieceType.KNIGHT,PieceType.BISHOP,PieceType.ROOK,PieceType.QUEEN))
+        if pieces == 0:
             return False
 
-        #No need to prove null moves below a certain depth
-        depth_new = depth_left - 1 - self.null_depth
-        if depth_new < 0:
-            depth_new = 0
-        
-        #We are good to go for null move
-        me.move(MoveProcessor.NULL_MOVE)
+        #Reduction grows with depth so null moves also pay off far from the horizon
+        reduction = self.NULL_REDUCTION + depth_left // self.NULL_REDUCTION_DIVISOR
+        depth_new = max(depth_left - 1 - reduction,0)
         
+        #We are good to go for null move, only prove that passing still fails high
+        me.move_null()
 
-        #Note we do not allow null move is this alphabeta search
-        sub_node = self.alphabeta(depth_new, -beta, -alpha,MoveProcessor.NULL_MOVE,False)
-        score = -sub_node.score
+        #No second null move directly after this one, null moves are allowed again below the next ply
+        score = -self.alphabeta(depth_new,-beta,-beta + 1,MoveProcessor.NULL_MOVE,False,extensions)
 
         #Undo move        
-        me.unmove()
+        me.unmove_null()
+
+        if score < beta:
+            return False
+
+        #Verification search, with little material left zugzwang is likely so the cutoff is confirmed by a reduced search without null moves
+        if self.__is_endgame or pieces <= self.NULL_VERIFY_PIECES:
+            self.null_verifications += 1
+            return self.alphabeta(depth_new,beta - 1,beta,p_move,False,extensions,verification=True) >= beta
 
         #Finally check against beta to see if we triggered a beta cutoff
-        return score >= beta
+        return True
     
-    def alphabeta(self,depth_left:int,alpha:int,beta:int,p_move:Move,allow_null:bool = True)->Node:
-        """Alpha beta search algorithm - https://www.chessprogramming.org/Alpha-Beta """
+    def alphabeta(self,depth_left:int,alpha:int,beta:int,p_move:Move,allow_null:bool = True,extensions:int = 0,excluded:int = TranspositionTable.MOVE_NONE,verification:bool = False)->int:
+        """
+        Alpha beta search algorithm - https://www.chessprogramming.org/Alpha-Beta \n
+        Returns score of the position, the best line found is left in pv_table[ply] \n
+        extensions - plies of extension used on the path from the root \n
+        allow_null - False for the node directly after a null move and for verification and singular searches, its children may try null moves again \n
+        excluded - packed move left out of the search, used to test if the hash move is singular \n
+        verification - reduced search of this position confirming a null move cutoff, its result is not stored
+        """
         #Check if we still have time
         self.__check_stop()
 
-        self.__depth_left = depth_left
-
-        c_node = Node(p_move,best_move=MoveProcessor.NULL_MOVE,score=None,quiescence=False,beta_cut=False) 
-
-        #Attempt transposition read
-        entry_node = self.transposition_table.attempt_read(self.move_engine.current_hash,depth_left)
-        if entry_node != None and not self.__folowing_left:
-            
-            #Case not beta cut, entry score gives lower bound. if lower bound is less than alpha we can return alpha
-            #as there is no chance of improving alpha
-            if not entry_node.beta_cut:
-                if entry_node.score <= alpha:
-                    pass
+        #Side to move and distance from root, used for mate scores, killer moves, history and the principal variation
+        color = self.turn
+        ply = len(self.move_engine.move_stack) - self.__root_ply
+        self.pv_length[ply] = ply
+
+        #Nodes on the principal variation of the last iteration search it first and are not cut or pruned, so it is searched fully
+        on_pv = self.__on_pv(ply,p_move)
+        pv_move = self.pv[ply] if on_pv else None
+
+        #Mate distance pruning https://www.chessprogramming.org/Mate_Distance_Pruning
+        #Being mated here is no worse than alpha if a faster mate is already known, mating from here no better than beta
+        if ply != 0:
+            alpha = max(alpha,-self.mate_score(ply))
+            beta = min(beta,self.mate_score(ply + 1))
+            if alpha >= beta:
+                self.mate_distance_prunes += 1
+                return alpha
+
+        alpha_original = alpha
+
+        #Attempt transposition read, root is always searched so we have a best move
+        hash_move = TranspositionTable.MOVE_NONE
+        entry = self.transposition_table.probe(self.move_engine.current_hash)
+        if entry != None:
+            entry_depth, entry_score, entry_bound, hash_move = entry
+            entry_score = self.score_from_table(entry_score,ply)
+            if entry_depth >= depth_left and ply != 0 and not on_pv and excluded == TranspositionTable.MOVE_NONE:
+                #Exact score and lower bounds at least beta guarantee a beta cut
+                if entry_bound != TranspositionTable.BOUND_UPPER and entry_score >= beta:
                     self.transpositions_read += 1
-                    c_node.score = alpha
-                    return c_node
-            #Case: beta cut: entry score gives upper bound. We can skip this node if upper bound is greater than beta
-            #Because we are guaranteed a beta cut
-            else:
-                if entry_node.score >= beta:
+                    return beta
+                #Exact score and upper bounds at most alpha, there is no chance of improving alpha
+                if entry_bound != TranspositionTable.BOUND_LOWER and entry_score <= alpha:
                     self.transpositions_read += 1
-
-                    c_node.score = beta
-                    c_node.best_move = entry_node.best_move
-                    c_node.best_node = entry_node.best_node
-                    c_node.beta_cut = True
-
-                    return c_node
+                    return alpha
+                #Exact score inside window
+                if entry_bound == TranspositionTable.BOUND_EXACT:
+                    self.transpositions_read += 1
+                    return entry_score
 
         self.__node_count += 1
 
@@ -438,87 +415,217 @@ class Engine():
 
         
         is_terminal = True
+        best_move = MoveProcessor.NULL_MOVE
+        beta_cut = False
+
+        #Late moves are not reduced when escaping check
+        in_check = self.move_engine.in_check
+        #Searches leaving out a move are only used to compare against the hash move, no pruning or null moves in them
+        exclusion = excluded != TranspositionTable.MOVE_NONE
+        can_reduce = depth_left >= self.LMR_MIN_DEPTH and not in_check
+        move_count = 0
+
+        #Pruning near the horizon https://www.chessprogramming.org/Futility_Pruning
+        #Not when in check, at the root, or when the window holds mate scores
+        futile = False
+        if depth_left <= self.PRUNING_DEPTH and not in_check and ply != 0 and not on_pv and not exclusion:
+            static_eval = Evaluation.evaluate(self.move_engine,alpha,beta,self.__is_endgame)
+
+            #Reverse futility pruning, we are so far above beta that no move of the opponent will bring us back
+            if abs(beta) < Evaluation.WEIGHT_CHECKMATE and static_eval - self.REVERSE_FUTILITY_MARGIN * depth_left >= beta:
+                self.reverse_futility_prunes += 1
+                return beta
+
+            #Razoring https://www.chessprogramming.org/Razoring, so far below alpha that only captures could help
+            if depth_left < len(self.RAZOR_MARGINS) and abs(alpha) < Evaluation.WEIGHT_CHECKMATE and static_eval + self.RAZOR_MARGINS[depth_left] < alpha:
+                if self.quiescence(alpha,beta,0,p_move) <= alpha:
+                    self.razor_prunes += 1
+                    return alpha
+
+            #Futility pruning, quiet moves can not raise the score enough to beat alpha
+            futile = abs(alpha) < Evaluation.WEIGHT_CHECKMATE and static_eval + self.FUTILITY_MARGINS[depth_left] <= alpha
 
 
         #Attempt null move evaluation if we are allowing null evaluation and we are not following the best node from last search
-        if allow_null and not self.__folowing_left:
-            null_eval = self.__null_evaluation(depth_left,alpha,beta,p_move)
+        if allow_null and not on_pv and not exclusion:
+            null_eval = self.__null_evaluation(depth_left,alpha,beta,p_move,extensions,ply)
             if null_eval:
                 self.__null_move_prunes += 1
-                c_node.score = beta
-                c_node.beta_cut = True
-                return c_node
+                return beta
 
+        #Singular extension https://www.chessprogramming.org/Singular_Extensions
+        #If the hash move failed high and every other move fails low against a lowered bound in a reduced search, the hash move is the only good move and is extended
+        budget = min(self.MAX_EXTENSIONS,self.__c_depth)
+        singular = False
+        if entry != None and hash_move != TranspositionTable.MOVE_NONE and not exclusion and not on_pv \
+            and depth_left >= self.SINGULAR_MIN_DEPTH and ply != 0 and extensions < budget \
+            and entry_bound != TranspositionTable.BOUND_UPPER and entry_depth >= depth_left - self.SINGULAR_ENTRY_DEPTH \
+            and abs(entry_score) < Evaluation.WEIGHT_CHECKMATE:
+            self.singular_searches += 1
+            singular_beta = entry_score - self.SINGULAR_MARGIN * depth_left
+            singular = self.alphabeta((depth_left - 1) // 2,singular_beta - 1,singular_beta,p_move,False,extensions,hash_move) < singular_beta
 
 
         #Evaluate moves
         def move_evaluate(move:Move)->bool:
-            nonlocal alpha,beta,c_node,self,depth_left,p_move,is_terminal
+            nonlocal alpha,beta,best_move,beta_cut,self,depth_left,p_move,is_terminal,move_count
+            packed = TranspositionTable.pack_move(move)
+            #Move is already made, side to move being in check means the move gives check
+            gives_check = self.move_engine.in_check
+
+            #At least one move is searched so checkmate and stalemate are still found
+            if futile and not is_terminal and not move.capture and move.move_type not in MoveType.PROMOTIONS and not gives_check:
+                self.futility_prunes += 1
+                return True
 
-            #Alpha beta for lower next turn's alpha beta search
-            new_alpha = -beta
-            new_beta = -alpha
+            #Check extension, forcing lines are searched one ply deeper so checks are not left to quiescence. Hash move is extended if singular
+            extension = 0
+            if extensions < budget:
+                if gives_check:
+                    extension = 1
+                    self.check_extensions += 1
+                elif singular and packed == hash_move:
+                    extension = 1
+                    self.singular_extensions += 1
+            depth_new = depth_left - 1 + extension
+            extensions_new = extensions + extension
+
+            #Principal variation search https://www.chessprogramming.org/Principal_Variation_Search
+            #First move is searched with full window, later moves are expected to be worse
+            #so we only prove they do not beat alpha with a null window, searching again if one does
+            if is_terminal:
+                #This node is not terminal as we were able to evaluate 1 node
+                is_terminal = False
+                score = -self.alphabeta(depth_new,-beta,-alpha,move,True,extensions_new)
+            else:
+                self.pvs_searches += 1
+
+                #Late move reductions https://www.chessprogramming.org/Late_Move_Reductions
+                #Quiet moves late in the order rarely beat alpha, they are searched shallower and searched again at full depth if they do
+                reduction = 0
+                if can_reduce and not gives_check and move_count >= self.LMR_MIN_MOVES and not move.capture and move.move_type not in MoveType.PROMOTIONS \
+                    and packed not in killers:
+                    reduction = min(self.lmr_table[min(depth_left,len(self.lmr_table) - 1)][min(move_count,63)],depth_new)
+
+                if reduction > 0:
+                    self.lmr_reductions += 1
+                    score = -self.alphabeta(depth_new - reduction,-alpha - 1,-alpha,move,True,extensions_new)
+                    if score > alpha:
+                        self.lmr_researches += 1
+                        score = -self.alphabeta(depth_new,-alpha - 1,-alpha,move,True,extensions_new)
+                else:
+                    score = -self.alphabeta(depth_new,-alpha - 1,-alpha,move,True,extensions_new)
 
-            #This node is not terminal as we were able to evaluate 1 node
-            is_terminal = False
+                if score > alpha and score < beta:
+                    self.pvs_researches += 1
+                    score = -self.alphabeta(depth_new,-beta,-alpha,move,True,extensions_new)
+            move_count += 1
 
-            #Run alpha beta for this move and get score
-            sub_node = self.alphabeta(depth_left - 1,new_alpha, new_beta,move,allow_null)
-            score = -sub_node.score
+            #Move improves upon score, its line becomes the best line of this node
+            if score > alpha:
+                best_move = move
+                self.__update_pv(ply,move)
+                if ply == 0: self.__root_score = score
 
             if score >= beta:
                 #Beta cutoff
-                c_node.best_move = move
-                c_node.beta_cut = True
-                c_node.best_node = sub_node
+                beta_cut = True
                 alpha = beta
+                if not move.capture and move.move_type not in MoveType.PROMOTIONS:
+                    self.__update_quiet_cutoff(move,color,ply,depth_left)
                 return False
             
-            #Check if move approves upon score
             if score > alpha:
-                c_node.best_move = move
-                c_node.best_node = None
                 alpha = score
 
-            
-
             return True        
 
+        #Best move stored in transposition table is searched first, quiet moves are ordered by killers and history
+        killers = self.killers[ply] if ply < len(self.killers) else [TranspositionTable.MOVE_NONE] * self.KILLER_SLOTS
+        history = self.history[color]
+        def presort_key(move:Move)->int:
+            weight = self.presort_key(move)
+            packed = TranspositionTable.pack_move(move)
+            if pv_move != None and move.id == pv_move.id:
+                weight += self.KEY_W_PV
+            elif packed == hash_move and hash_move != TranspositionTable.MOVE_NONE:
+                weight += self.KEY_W_HASH
+            elif not move.capture and move.move_type not in MoveType.PROMOTIONS:
+                bonus = self.KEY_W_KILLER if packed in killers else 0
+                bonus += min(history[move.pos_from][move.pos_to] * self.KEY_W_HISTORY // self.HISTORY_MAX,self.KEY_W_HISTORY)
+                weight += min(bonus,self.KEY_W_QUIET_MAX)
+            return weight
+
         #Sort moves if we are halfway to horizon or less this is arbitrary right now 
         #Tune this later. We gain a lot from sorting at the beginning of search very little after that
         #if (self.__c_depth - depth_left)/self.__c_depth <= 0.75:
-        self.move_engine.loop_moves(move_evaluate,self.presort_key,None)
+        include_key = (lambda move: TranspositionTable.pack_move(move) != excluded) if exclusion else None
+        #Searches of this position made above (singular, null move verification) may have left a line here
+        self.pv_length[ply] = ply
+        self.move_engine.loop_moves(move_evaluate,presort_key,include_key)
         #else:
             #self.move_engine.loop_moves(move_evaluate,None,None)
         score = alpha
 
+        #Only move is the excluded one, which makes it singular
+        if is_terminal and exclusion:
+            return alpha
+
         if is_terminal:
             terminal_status = self.move_engine.terminal_status
             if terminal_status == TerminalStatus.Draw or terminal_status == TerminalStatus.Stalemate:
                 score = 0
             elif terminal_status == TerminalStatus.Checkmate:
-                #We are in check this must be checkmate, add an incentive for faster checkmates by addubg depth left to score
-                #Coeficient for checkmate if it's whites turn should be -1000 as white got checkmated if it's blacks turn it should be -1000 as black got checkmated
-                #At horizon we reuturn evaluate() whose sign is positive if player whose turn it is is winning, no negation since we do not negate evaluate()
-                score = -(Evaluation.WEIGHT_CHECKMATE + 1000*depth_left)
+                #We are in check this must be checkmate, faster checkmates score higher as the score falls with ply from root
+                #Score is from the side to move, who got checkmated
+                score = -self.mate_score(ply)
             else:
                 raise Exception("Node is terminal but no terminal status is asigned")
 
-            c_node.best_move = MoveProcessor.NULL_MOVE
-            c_node.best_node = None
-
-        c_node.score = score
-
 
         #Record node in transposition table
-        self.transposition_table.add_entry(self.move_engine.current_hash,depth_left,c_node,alpha,beta)
+        #Beta cut gives lower bound, alpha not raised gives upper bound, otherwise score is exact
+        if beta_cut:
+            bound = TranspositionTable.BOUND_LOWER
+        elif score > alpha_original or is_terminal:
+            bound = TranspositionTable.BOUND_EXACT
+        else:
+            bound = TranspositionTable.BOUND_UPPER
+        #Result of a search leaving out a move does not describe the position, a verification search would replace the entry of the full depth search with a shallow null window result
+        if not exclusion and not verification:
+            self.transposition_table.store(self.move_engine.current_hash,depth_left,self.score_to_table(score,ply),bound,best_move)
 
-        
-        
-        return c_node
+        return score
 
-    def search_tree(self,depth:int)->Node:
-        """Searches tree for best moves using alpha beta search algorithm https://www.chessprogramming.org/Alpha-Beta"""
+    def __on_pv(self,ply:int,p_move:Move)->bool:
+        """True if the path from the root to this node follows the principal variation of the last search of the same root"""
+        if ply == 0:
+            following = len(self.pv) > 0 and self.__pv_root == self.move_engine.current_hash
+        else:
+            following = self.__pv_following[ply - 1] and p_move.id == self.pv[ply - 1].id
+        following = following and ply < len(self.pv)
+        self.__pv_following[ply] = following
+        return following
+
+    def __update_pv(self,ply:int,move:Move):
+        """Best line of node at ply becomes move followed by the best line of the child https://www.chessprogramming.org/Triangular_PV-Table"""
+        line = self.pv_table[ply]
+        line[ply] = move
+        child_line = self.pv_table[ply + 1]
+        child_length = self.pv_length[ply + 1]
+        for index in range(ply + 1,child_length):
+            line[index] = child_line[index]
+        self.pv_length[ply] = max(child_length,ply + 1)
+
+    def principal_variation(self)->list[Move]:
+        """Best line found by the last completed search"""
+        return list(self.pv)
+
+    def search_tree(self,depth:int,alpha:int = ALPHA_DEF,beta:int = BETA_DEF)->tuple[int,Move]:
+        """
+        Searches tree for best moves using alpha beta search algorithm https://www.chessprogramming.org/Alpha-Beta \n
+        Returns (score, best move), the best line is kept in pv
+        """
         assert depth != 0
         #Check to see if we have time
         self.__check_stop()
@@ -532,89 +639,227 @@ class Engine():
         self.__is_endgame = Evaluation.is_endgame(self.move_engine)
         
         self.__c_depth = depth
-        self.__depth_left = depth
-        result_node = self.alphabeta(depth,Engine.ALPHA_DEF,Engine.BETA_DEF,MoveProcessor.NULL_MOVE,True)
+        self.__root_ply = len(self.move_engine.move_stack)
+        self.__root_window = (alpha,beta)
+        try:
+            score = self.alphabeta(depth,alpha,beta,MoveProcessor.NULL_MOVE,True)
+        except Engine.TimeUpException:
+            #Search stopped somewhere in the tree, undo the moves it had made
+            self.move_engine.unwind(self.__root_ply)
+            raise
+        finally:
+            self.move_engine.allow_null = allow_null
 
-        self.move_engine.allow_null = allow_null
+        #A search failing low at the root has no line, the previous one is kept for move ordering
+        if self.pv_length[0] == 0:
+            return (score,MoveProcessor.NULL_MOVE)
+        self.pv = self.pv_table[0][:self.pv_length[0]]
+        self.__pv_root = self.move_engine.current_hash
+        return (score,self.pv[0])
 
-        return result_node
 
 
 
+    def __update_quiet_cutoff(self,move:Move,color:int,ply:int,depth_left:int):
+        """
+        Records quiet move that caused beta cutoff \n
+        Killer moves - https://www.chessprogramming.org/Killer_Heuristic \n
+        History heuristic - https://www.chessprogramming.org/History_Heuristic
+        """
+        if ply < len(self.killers):
+            killers = self.killers[ply]
+            packed = TranspositionTable.pack_move(move)
+            if killers[0] != packed:
+                killers.insert(0,packed)
+                killers.pop()
+
+        history = self.history[color][move.pos_from]
+        history[move.pos_to] += depth_left * depth_left
+        if history[move.pos_to] >= self.HISTORY_MAX:
+            self.age_history()
+
+    def mate_score(self,ply:int)->int:
+        """Score of giving checkmate ply plies from the root, mates closer to the root score higher. Being checkmated scores the negative"""
+        return Evaluation.WEIGHT_CHECKMATE + self.MATE_PLY_WEIGHT * (self.MAX_PLY - ply)
+
+    def score_to_table(self,score:int,ply:int)->int:
+        """
+        Converts score at ply into score for transposition table. \n
+        Mate scores are stored as distance from the stored position instead of the root, so they stay valid at any ply and in later searches
+        """
+        if score >= Evaluation.WEIGHT_CHECKMATE:
+            return score + self.MATE_PLY_WEIGHT * ply
+        if score <= -Evaluation.WEIGHT_CHECKMATE:
+            return score - self.MATE_PLY_WEIGHT * ply
+        return score
+
+    def score_from_table(self,score:int,ply:int)->int:
+        """Converts score read from transposition table back to score at ply"""
+        if score >= Evaluation.WEIGHT_CHECKMATE:
+            return score - self.MATE_PLY_WEIGHT * ply
+        if score <= -Evaluation.WEIGHT_CHECKMATE:
+            return score + self.MATE_PLY_WEIGHT * ply
+        return score
+
+    def build_lmr_table(self):
+        """Builds reductions by depth left and move number, reductions grow logarithmically with both"""
+        self.lmr_table = [[0] * 64 for depth in range(self.MAXDEPTH + 1)]
+        for depth in range(1,self.MAXDEPTH + 1):
+            for move_count in range(1,64):
+                self.lmr_table[depth][move_count] = int(self.LMR_BASE + math.log(depth) * math.log(move_count) / self.LMR_DIVISOR)
+
+    def clear_move_ordering(self):
+        """Clears killer moves and history"""
+        self.killers = [[TranspositionTable.MOVE_NONE] * self.KILLER_SLOTS for ply in range(self.MAX_PLY)]
+        self.history = [[[0] * 64 for pos_from in range(64)] for color in range(2)]
+
+    def age_history(self):
+        """Halves history scores so recent cutoffs count more than old ones"""
+        for color_history in self.history:
+            for history in color_history:
+                for pos_to in range(64):
+                    history[pos_to] >>= 1
+
+    def search_aspiration(self,depth:int,guess:int)->tuple[int,Move]:
+        """
+        Searches tree with a window around the score of the previous iteration https://www.chessprogramming.org/Aspiration_Windows \n
+        The window is widened on the failing side and searched again until the score falls inside it
+        """
+        #Mate scores are far apart, search them with the full window
+        if abs(guess) >= Evaluation.WEIGHT_CHECKMATE:
+            return self.search_tree(depth)
+
+        delta = self.ASPIRATION_WINDOW
+        alpha = guess - delta
+        beta = guess + delta
+        while True:
+            self.aspiration_searches += 1
+            score, move = self.search_tree(depth,alpha,beta)
+            if score <= alpha and alpha > Engine.ALPHA_DEF:
+                self.aspiration_fail_low += 1
+                delta *= self.ASPIRATION_GROWTH
+                alpha = max(guess - delta,Engine.ALPHA_DEF) if delta < self.ASPIRATION_MAX else Engine.ALPHA_DEF
+            elif score >= beta and beta < Engine.BETA_DEF:
+                self.aspiration_fail_high += 1
+                delta *= self.ASPIRATION_GROWTH
+                beta = min(guess + delta,Engine.BETA_DEF) if delta < self.ASPIRATION_MAX else Engine.BETA_DEF
+            else:
+                return (score,move)
+
+    def __book_key(self)->int:
+        """Polyglot key of the current position, the incremental hash is used directly if the cache uses polyglot keys"""
+        if self.cache.polyglot_keys:
+            return self.move_engine.current_hash
+        if self.__book_cache == None:
+            self.__book_cache = MoveCache(polyglot_keys=True)
+        return ChessHashing.hash(self.__book_cache,self.board)
 
-    def __attempt_opening_book_read(self)->Move:
+    def attempt_opening_book_read(self)->Move:
         """Attempts to read move from opening book \n
-        uses python chess to interface with polyglot book \n
+        the book is memory mapped on first read and probed with polyglot hash of our board \n
         book used - https://www.chessprogramming.net/new-version-of-the-baron-v3-43-plus-the-barons-polyglot-opening-book/ \n
         returns None if no move can be found \n
         """
         #If we are not in opening book move do not attempt read
         if not self.opening_book_mode: return None
-        #Convert from our board format to python board format with 
-        py_board = chess.Board(BoardIO.get_fen(self.board))
-        with chess.polyglot.open_reader(self.PATH_OPENING) as reader:
-            try:
-                entry = reader.weighted_choice(py_board)
-            except IndexError:
-                #No move can be read from opening book
-                return None
-        #Return the move
-        return PseudoMoveGenerator.from_uci(self.board,self.cache,entry.move.uci())
+        if self.opening_book == None:
+            self.opening_book = OpeningBook(self.PATH_OPENING)
+        if self.opening_book_weighted:
+            return self.opening_book.weighted_choice(self.move_engine,self.__book_key())
+        return self.opening_book.best(self.move_engine,self.__book_key())
     
     
 
 
         
 
-    def ponder(self,time_ponder:int)->tuple[int,Move]:
+    def ponder(self,time_ponder:float = None,time_left:float = None,increment:float = 0,moves_to_go:int = None)->tuple[int,Move]:
         """
         Search for best move for a set ammount of time\n
-        time_ponder - the time to ponder the given move
+        time_ponder - the time to ponder the given move \n
+        time_left, increment, moves_to_go - clock of the side to move, time for the move is taken from the clock if time_left is given \n
+        Raises ValueError if neither time_ponder nor time_left is given
         """
-        #Update transposition tables
-        self.transposition_table.advance_turn()
+        self.depth_reached = 0
+        self.aspiration_searches = 0
+        self.aspiration_fail_low = 0
+        self.aspiration_fail_high = 0
+
+        #Clock is started before the book is probed so a missing time budget is reported even if the book has a move
+        self.time_manager.stop_flag = self.stop_flag
+        self.time_manager.start(time_ponder,time_left,increment,moves_to_go)
+
+        #Entries from earlier searches become replaceable, with a shared table only the main search advances the generation
+        if not self.smp_helper:
+            self.transposition_table.new_search()
 
         #Attempt opening book read
-        opening_move = self.__attempt_opening_book_read()
+        opening_move = self.attempt_opening_book_read()
         if opening_move != None:
-            logging.info("Opening book move read")
+            self.__log("Opening book move read")
             return (0,opening_move)
 
-        #Continue to ponder even if an opening move is read to increase transposition table
-        self.__p_wieghts_used = 0
-
         #Search tree to find move for depth of 1 so even if we timeout we still have move to
-        self.__last_ponder = self.search_tree(1)
-
-        #Todo replace deepcopy by tracking the total depth and undoing moves 
-        me_copy1 = deepcopy(self.move_engine)
-
-        self.move_engine = me_copy1
-
-        me_copy2 = deepcopy(self.move_engine)
-
+        score, best_move = self.search_tree(1)
+        self.depth_reached = 1
 
         #Set up pondering variables
         self.__pondering = True
-        self.__t_start = time.time()
-        self.__t_ponder = time_ponder
+        self.__poll_countdown = TimeManager.POLL_NODES
         time_up = False
 
         prunes = self.__null_move_prunes
+        verifications = self.null_verifications
         reads = self.transpositions_read
         node_count =  self.__node_count
-
-        for i in range(2,self.MAXDEPTH + 1):
+        pvs_searches = self.pvs_searches
+        pvs_researches = self.pvs_researches
+        lmr_reductions = self.lmr_reductions
+        lmr_researches = self.lmr_researches
+        pruning = (self.futility_prunes,self.reverse_futility_prunes,self.razor_prunes,self.mate_distance_prunes)
+        extended = (self.check_extensions,self.singular_extensions,self.singular_searches)
+
+        #Iterations stop once the offset depth reaches MAXDEPTH, so no depth is searched twice
+        depth_offset = min(max(self.depth_offset,0),self.MAXDEPTH - 2)
+        for i in range(2,self.MAXDEPTH + 1 - depth_offset):
             try:
                 #Keep track of variables
                 prunes = self.__null_move_prunes
+                verifications = self.null_verifications
                 reads = self.transpositions_read
                 node_count =  self.__node_count
+                pvs_searches = self.pvs_searches
+                pvs_researches = self.pvs_researches
+                lmr_reductions = self.lmr_reductions
+                lmr_researches = self.lmr_researches
+                pruning = (self.futility_prunes,self.reverse_futility_prunes,self.razor_prunes,self.mate_distance_prunes)
+                extended = (self.check_extensions,self.singular_extensions,self.singular_searches)
+
+                #Past the soft limit the next iteration would likely not finish
+                if self.time_manager.soft_stop():
+                    self.__log(f"Depth reached in {self.time_manager.elapsed:.2f} (s) ponder: {i - 1}")
+                    time_up = True
+                    break
 
                 self.__reset_counters()
-                self.__last_ponder = self.search_tree(i)
+                self.age_history()
+                depth = i + depth_offset
+                #Root line is only set once the iteration searched a root move
+                self.pv_length[0] = 0
+                score, best_move = self.search_aspiration(depth,score)
+                self.depth_reached = depth
+                self.__log(f"Depth {depth} score {score} pv {' '.join(move.uci for move in self.pv)}")
             except Engine.TimeUpException:
-                logging.info(f"Depth reached in {time_ponder:.2f} (s) ponder: {i - 1}")
+                #Root moves searched before the hard limit were searched to the full depth, the best of them is kept
+                if self.pv_length[0] > 0:
+                    best_move = self.pv_table[0][0]
+                    self.pv = self.pv_table[0][:self.pv_length[0]]
+                    #A score failing high on the aspiration window is only a bound, the move beat the window but the score of the last completed iteration is kept
+                    root_alpha, root_beta = self.__root_window
+                    if root_alpha < self.__root_score < root_beta:
+                        score = self.__root_score
+                    self.__log(f"Depth {depth} (partial) score {score} pv {' '.join(move.uci for move in self.pv)}")
+                self.__log(f"Depth reached in {self.time_manager.elapsed:.2f} (s) ponder: {i - 1}")
                 time_up = True
                 break
             except Exception as e:
@@ -622,57 +867,94 @@ class Engine():
                 logging.info(self.move_engine.move_stack)
                 raise e
         
-        if not time_up:
-            print(f"Maximum Depth ({self.MAXDEPTH}) reached in {time_ponder:.2f}")
+        if not time_up and self.log_search:
+            print(f"Maximum Depth ({self.MAXDEPTH}) reached in {self.time_manager.elapsed:.2f}")
             pass
     
         self.__pondering = False
-        self.__t_start = None
-        self.__t_ponder = None
-        self.__depth_left = 0
         self.__c_depth = 0
 
-        
-
-        self.move_engine = me_copy2
-
-        best_move = self.__last_ponder.best_move
-        score = self.__last_ponder.score
-
         # (branch_factor) ^ max_depth = total_node_count
         # => branch_factor = (total_node_count) ^ 1 / max_depth
         branch_factor = node_count ** (1/i) 
 
-        logging.info(f"Transposition entries read {reads}")
-        logging.info(f"Null move prunes: {prunes}")
-        logging.info(f"Branching factor: {branch_factor:.2f}")
+        self.__log(f"Transposition entries read {reads}")
+        self.__log(f"Transposition table full: {self.transposition_table.hashfull() / 10:.1f}%")
+        self.__log(f"Null move prunes: {prunes} verification searches: {verifications}")
+        self.__log(f"PVS re-searches: {pvs_researches} / {pvs_searches} ({100 * pvs_researches / max(pvs_searches,1):.1f}%)")
+        self.__log(f"Late move reductions: {lmr_reductions} re-searched: {lmr_researches} ({100 * lmr_researches / max(lmr_reductions,1):.1f}%)")
+        self.__log(f"Futility prunes: {pruning[0]} reverse futility: {pruning[1]} razoring: {pruning[2]} mate distance: {pruning[3]}")
+        self.__log(f"Check extensions: {extended[0]} singular extensions: {extended[1]} of {extended[2]} tested")
+        self.__log(f"Aspiration windows failed low: {self.aspiration_fail_low} high: {self.aspiration_fail_high} of {self.aspiration_searches} searches")
+        self.__log(f"Branching factor: {branch_factor:.2f}")
 
         self.__reset_counters()
-        
-        self.__last_ponder = None
 
         if opening_move != None:
             return (0,opening_move)
         
         return (score,best_move)
     
+    def __log(self,message:str):
+        """Logs search progress at info level unless search logging is turned off"""
+        if self.log_search:
+            logging.info(message)
+
     def __reset_counters(self):
+        self.pvs_searches = 0
+        self.pvs_researches = 0
+        self.lmr_reductions = 0
+        self.lmr_researches = 0
+        self.futility_prunes = 0
+        self.reverse_futility_prunes = 0
+        self.razor_prunes = 0
+        self.mate_distance_prunes = 0
+        self.check_extensions = 0
+        self.singular_extensions = 0
+        self.singular_searches = 0
         self.__null_move_prunes = 0
-        self.__p_wieghts_used = 0
+        self.null_verifications = 0
         self.transpositions_read = 0
         self.__node_count = 0
         
-    def __init__(self,cache:MoveCache,move_engine:MoveEngine == None) -> None:
+    def __init__(self,cache:MoveCache,move_engine:MoveEngine = None,transposition_table:TranspositionTable = None) -> None:
+        """
+        move_engine - position to search, it is searched in place and left as it was after every search \n
+        transposition_table - table to search with, e.g. a table shared with other engines. A new table of hash_mb is created if None
+        """
         if self.debug:
             logging.basicConfig(level=logging.DEBUG)
 
         self.cache = cache
         _me = move_engine
-        self.transposition_table = TranspositionTable()
+        self.transposition_table = TranspositionTable(self.hash_mb) if transposition_table == None else transposition_table
+
+        #All search state belongs to the instance so engines in different threads do not interfere
+        self.nodes = 0
+        self.depth_reached = 0
+        self.opening_book = None
+        self.__book_cache = None
+        self.__is_endgame = False
+        self.__c_depth = 0
+        self.__pondering = False
+        self.__poll_countdown = TimeManager.POLL_NODES
+        self.__root_score = 0
+        self.__root_window = (Engine.ALPHA_DEF,Engine.BETA_DEF)
+        self.time_manager = TimeManager()
+        self.__root_ply = 0
+        #One row per ply plus one, so the child row of the deepest node exists
+        self.pv_table = [[MoveProcessor.NULL_MOVE] * (self.MAX_PLY + 1) for _ in range(self.MAX_PLY + 1)]
+        self.pv_length = [0] * (self.MAX_PLY + 1)
+        self.pv = []
+        self.__pv_root = 0
+        self.__pv_following = [False] * (self.MAX_PLY + 1)
+        self.clear_move_ordering()
+        self.build_lmr_table()
+        self.__reset_counters()
         if _me == None:
             board = BoardIO.from_fen(FEN.START_POS)
             _me = MoveEngine(board,cache)
-        self.move_engine = deepcopy(_me)
+        self.move_engine = _me
             
  
 def test():
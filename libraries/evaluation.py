@@ -150,22 +150,25 @@ class PST:
         return PST.TABLES_MIDDLE[color][piece_type]
 
 class Evaluation:
-    PIECE_WIEGHTS_BASIC = {PieceType.PAWN: 100, PieceType.KNIGHT:320, PieceType.BISHOP:330, PieceType.ROOK:500, PieceType.QUEEN:900}
-    PIECE_WIEGHTS_BASIC_KING = {PieceType.PAWN: 100, PieceType.KNIGHT:320, PieceType.BISHOP:330, PieceType.ROOK:500, PieceType.QUEEN:900,PieceType.KING:10000}
+    PIECE_WIEGHTS_BASIC = {piece_type: PieceType.VALUES[piece_type] for piece_type in (PieceType.PAWN,PieceType.KNIGHT,PieceType.BISHOP,PieceType.ROOK,PieceType.QUEEN)}
+    PIECE_WIEGHTS_BASIC_KING = {piece_type: PieceType.VALUES[piece_type] for piece_type in range(6)}
     """Piece weights in centi pawns - https://www.chessprogramming.org/Simplified_Evaluation_Function """
     WEIGHT_CHECKMATE = 100000
     FANCY = True
     """If false evaluations use only basic wieghts and piece square tables. If true more advanced metrics are included"""
 
     @staticmethod
-    def evaluate(me:MoveEngine,alpha:int,beta:int,first_quiet:bool,_endgame:bool):
-        """Evaluates static position, symetric sign IE if it is white's positive score is winning for white if black's turn positive score is winning for black"""
+    def evaluate(me:MoveEngine,alpha:int,beta:int,_endgame:bool):
+        """
+        Evaluates static position, symetric sign IE if it is white's positive score is winning for white if black's turn positive score is winning for black \n
+        Checkmate is not detected here, the search scores it by distance from the root
+        """
         coef = 1 if me.turn == PieceColor.WHITE else -1
 
         #In future implement delta pruning
         eval = 0
 
-        eval += Evaluation.evaluation_material_basic(me,first_quiet,_endgame)
+        eval += Evaluation.evaluation_material_basic(me,_endgame)
         eval += Evaluation.eval_positions_basic(me,_endgame)
         eval += Evaluation.eval_king_saftey_basic(me,_endgame)
 
@@ -266,14 +269,11 @@ class Evaluation:
 
 
     @staticmethod
-    def evaluation_material_basic(me:MoveEngine,first_quiet:bool,is_endgame:bool)->int:
+    def evaluation_material_basic(me:MoveEngine,is_endgame:bool)->int:
         """Evaluates the difference in material wieghts for both sides, positive means more material for white, negative more material for black"""
         material = []
         board = me.board
 
-        if first_quiet and me.in_checkmate():
-            return -Evaluation.WEIGHT_CHECKMATE if board.turn == PieceColor.WHITE else Evaluation.WEIGHT_CHECKMATE
-
         color_eval = [[],[]]
 
         #Get evaluation for black and white pieces
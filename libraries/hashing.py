@@ -20,9 +20,35 @@ class ChessHashing:
         return hash
     
 
+    @staticmethod
+    def hash_enpassant(hash:int,cache:MoveCache,board:Board)->int:
+        """
+        Hashes enpassant target of the board. \n
+        In polyglot key mode the target is only hashed if a pawn of the side to move can capture it
+        """
+        target = ChessHashing.hashed_enpassant_target(cache,board.enpassant_target,board,board.turn)
+        return ChessHashing.hash_enpassant_target(hash,cache,target)
+
+    @staticmethod
+    def hashed_enpassant_target(cache:MoveCache,target:int,board:Board,color:int)->int:
+        """
+        Returns the enpassant target as it is hashed. \n
+        In polyglot key mode None is returned unless a pawn of color on board can capture the target
+        """
+        if target == None or not cache.polyglot_keys:
+            return target
+        if not ChessHashing.enpassant_capturable(cache,target,board.get_board_piece(color,PieceType.PAWN).value):
+            return None
+        return target
+
+    @staticmethod
+    def enpassant_capturable(cache:MoveCache,target:int,pawns:int)->bool:
+        """Returns true if any of the pawns in the pawns bitboard value stand beside the enpassant target"""
+        return cache.bitm_enpassant_capturers[target] & pawns != 0
+
     @staticmethod
     def hash_turn(hash:int,cache:MoveCache,turn:int)->int:
-        if turn == PieceColor.BLACK:
+        if turn == cache.hash_turn_color:
             return hash ^ cache.get_hash_turn(turn)
         return hash
 
@@ -48,7 +74,7 @@ class ChessHashing:
         hash = ChessHashing.hash_castle(hash,cache,board.castle_rights)
         
         #Hash enpassant target
-        hash = ChessHashing.hash_enpassant_target(hash,cache,board.enpassant_target)
+        hash = ChessHashing.hash_enpassant(hash,cache,board)
         
         #Hash turn
         hash = ChessHashing.hash_turn(hash,cache,board.turn)
@@ -57,10 +83,11 @@ class ChessHashing:
     
 
     @staticmethod
-    def update_instruction(hash:int,cache:MoveCache,instruction:MoveInstruction):
+    def update_instruction(hash:int,cache:MoveCache,instruction:MoveInstruction,board:Board):
         """
         Incrementally upadate the given zobrist hash according to the given move instruction
-        https://www.chessprogramming.org/Zobrist_Hashing
+        https://www.chessprogramming.org/Zobrist_Hashing \n
+        board - the board before the move is made, used in polyglot key mode to decide if enpassant targets are hashed
         """
         #using fact that XOR is it's own inverse we can hash a position without recalculating everything
         #https://www.chessprogramming.org/Zobrist_Hashing
@@ -91,18 +118,21 @@ class ChessHashing:
         _hash = ChessHashing.hash_castle(_hash,cache,instruction.castling_rights_current)
 
         #Update enpassant target
+        #The pawns that may capture a new target do not change during the move that sets it
+        previous = ChessHashing.hashed_enpassant_target(cache,instruction.enpassant_target_previous,board,color)
+        current = ChessHashing.hashed_enpassant_target(cache,instruction.enpassant_target_current,board,PieceColor.reverse_color(color))
         #Undo previous enpassant target
-        _hash = ChessHashing.hash_enpassant_target(_hash,cache,instruction.enpassant_target_previous)
+        _hash = ChessHashing.hash_enpassant_target(_hash,cache,previous)
         #Hash new enpassant target
-        _hash = ChessHashing.hash_enpassant_target(_hash,cache,instruction.enpassant_target_current)
+        _hash = ChessHashing.hash_enpassant_target(_hash,cache,current)
 
         #Advance turn
-        #To advance turn we always XOR hash by the black turn color
-        #When hashing we only XOR hash by black turn hash when it is black's turn
-        #nothing is done on white's turn
-        #by XOR ing hash by black turn hash we undo black turn if it's whites turn and
-        #go to black's turn if it is black's turn
-        _hash = ChessHashing.hash_turn(_hash,cache,PieceColor.BLACK)
+        #To advance turn we always XOR hash by the turn hash
+        #When hashing we only XOR hash by turn hash when it is hash_turn_color's turn
+        #nothing is done on the other turn
+        #by XOR ing hash by turn hash we undo the turn hash if it was included and
+        #include it if it was not
+        _hash = _hash ^ cache.hashes_turn
 
     
         return _hash
@@ -116,6 +146,6 @@ class ChessHashing:
         https://www.chessprogramming.org/Zobrist_Hashing
         """
         inst = MoveProcessor.process_move(board,cache,move)
-        return ChessHashing.update_instruction(hash,cache,inst)
+        return ChessHashing.update_instruction(hash,cache,inst,board)
     
 
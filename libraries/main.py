@@ -1,6 +1,7 @@
 from cmd import Cmd
 from moveengine import *
 from chessengine import *
+from smp import *
 
 class  ChessInterface(Cmd):
     gamemode:bool = False
@@ -9,6 +10,15 @@ class  ChessInterface(Cmd):
 
     ponder_time = 10
 
+    clock_time:float = None
+    """Time left on the engine's clock (s), the engine plays on the clock instead of ponder_time if set"""
+    clock_increment:float = 0
+    clock_moves_to_go:int = None
+
+    threads:int = 1
+
+    __smp:ParallelSearch = None
+
     intro:str = (
     "Welcome to unnamed chess engine console\n"
     "Type \"help\" for help or \"help\" \"Command\" for help with a specific command"
@@ -165,6 +175,63 @@ Example: Get fen of current board
         except ValueError:
             print("Please enter float")
 
+    def do_clock(self,args:str):
+        """
+clock "Time" "Increment" ["Moves to go"]
+--------------------------------------------------------
+Gives the Chess Engine a clock in seconds, the time of every move is taken from it
+"clock off" goes back to a fixed ponder time per move \n
+Example: 5 minutes with 3 second increment
+------------------------------------
+(chess) clock 300 3
+------------------------------------
+        """
+        if args.strip() == "off":
+            self.clock_time = None
+            print(f"Clock off, ponder time {self.ponder_time:.2f} (s)")
+            return
+        try:
+            values = args.split()
+            assert len(values) in (2,3)
+            clock_time, increment = float(values[0]), float(values[1])
+            moves_to_go = int(values[2]) if len(values) == 3 else None
+            assert clock_time > 0 and increment >= 0 and (moves_to_go == None or moves_to_go > 0)
+        except:
+            print("Please enter time and increment, optionally followed by moves to go")
+            return
+
+        self.clock_time, self.clock_increment, self.clock_moves_to_go = clock_time, increment, moves_to_go
+        print(f"Clock set to {clock_time:.2f} (s) + {increment:.2f} (s)")
+
+    def do_threads(self,args:str):
+        """
+threads "Count"
+--------------------------------------------------------
+Sets the number of threads the Chess Engine searches with (Lazy SMP)
+Helpers are threads on free threaded python, processes otherwise
+https://www.chessprogramming.org/Lazy_SMP
+        """
+        try:
+            threads = int(args)
+            assert threads >= 1
+        except:
+            print("Please enter integer of at least 1")
+            return
+
+        self.close_smp()
+        self.threads = threads
+        if threads > 1:
+            self.__smp = create_parallel_search(self.cache,threads)
+            self.ce.transposition_table = self.__smp.table
+        print(f"Threads set to {threads}")
+
+    def close_smp(self):
+        """Stops parallel search helpers, engine goes back to its own transposition table"""
+        if self.__smp == None: return
+        self.__smp.close()
+        self.__smp = None
+        self.ce.transposition_table = TranspositionTable(self.ce.hash_mb)
+
     def do_perft(self,args):
         """
 Evalutate perft up to a given depth 
@@ -214,14 +281,25 @@ Finds the chess engine's top move and executes it
         """
         ce = self.ce
 
-        ce.move_engine = deepcopy(self.me)
+        #Engine searches self.me in place and restores it, no copy is needed
+        ce.move_engine = self.me
 
-    
         if self.__show_profile:
             pr = cProfile.Profile()
             pr.enable()
 
-        eval,move = ce.ponder(self.ponder_time)
+        clock = () if self.clock_time == None else (self.clock_time,self.clock_increment,self.clock_moves_to_go)
+        t_start = time.time()
+        if self.__smp != None:
+            eval,move = self.__smp.ponder(ce,self.ponder_time,*clock)
+        else:
+            eval,move = ce.ponder(self.ponder_time,*clock)
+
+        if self.clock_time != None:
+            self.clock_time += self.clock_increment - (time.time() - t_start)
+            if self.clock_moves_to_go != None:
+                self.clock_moves_to_go = self.clock_moves_to_go - 1 if self.clock_moves_to_go > 1 else None
+            print(f"Clock {self.clock_time:.2f} (s)")
 
         if self.__show_profile:
             pr.disable()
@@ -256,7 +334,7 @@ Finds the chess engine's top move and executes it
 
     def __init__(self) -> None:
         super().__init__()
-        self.cache = MoveCache()
+        self.cache = MoveCache(polyglot_keys=True)
         board = BoardIO.from_fen(FEN.START_POS)
         self.me = MoveEngine(board,self.cache)
         self.ce = Engine(self.cache,self.me)
@@ -264,7 +342,11 @@ Finds the chess engine's top move and executes it
 
 
 def main():
-    ChessInterface().cmdloop()
+    interface = ChessInterface()
+    try:
+        interface.cmdloop()
+    finally:
+        interface.close_smp()
 
 
 
@@ -3,6 +3,8 @@ from board import *
 from ctypes import c_uint64
 from dataclasses import dataclass
 import random
+import zlib
+from polyglot import POLYGLOT_RANDOM_ARRAY
 
 
 class MoveType:
@@ -118,6 +120,12 @@ class MoveCache(HashUtil):
     bitm_squares_light:Bitboard = None
     bitm_squares_dark:Bitboard = None
 
+    bitm_between:list[list[int]] = None
+    """
+    Raw bitboard values of the squares strictly between two squares, indexed [square1][square2].
+    0 if squares do not share a rank, file, diagonal or off diagonal
+    """
+
     bitm_line_labels = None
     """
     Dictionary of bitmasks for ranks,files, diagonals and off diagonals. 
@@ -165,12 +173,41 @@ class MoveCache(HashUtil):
     Hashes for Zobrist hashing function 
     https://en.wikipedia.org/wiki/Zobrist_hashing
     """
+    HASH_SEED:int = 8293449743051711766
+    """Seed the hash keys are generated from, every process generates the same keys"""
+    HASH_KEY_FORMAT:int = 1
+    """Increment when the way hash keys are generated changes"""
+
+    hash_key_version:str = None
+    """Identifies the key set, hashes may only be shared between caches with the same key version"""
+
+    polyglot_keys:bool = False
+    """
+    If true the keys of the polyglot opening book format are used instead of seeded keys
+    so hashes can be used directly as opening book keys. http://hgm.nubati.net/book_format.html \n
+    In this mode turn is hashed on white's turn and enpassant is only hashed if a pawn is able to capture
+    """
+    hash_turn_color:int = PieceColor.BLACK
+    """Turn hash is included when it is this color's turn"""
+
     hashes_white_pieces:list[list[int]] = None
     hashes_black_pieces:list[list[int]] = None
     hashes_castling_rights:list[int] = None
     hashes_enpassant_target:list[int] = None
     hashes_turn:int = None
 
+    #Precomputed XOR deltas for incremental hashing during move making
+    hashes_pieces:list[list[int]] = None
+    """Piece hashes indexed by board piece list position (see Board.get_list_pos) and square"""
+    hashes_move_delta:list[list[list[int]]] = None
+    """XOR of piece hash on from and to square indexed [list position][from][to]"""
+    hashes_castling_delta:list[list[int]] = None
+    """XOR of castling rights hashes indexed [previous rights][current rights]"""
+    hashes_enpassant_square:list[int] = None
+    """Enpassant hash indexed by enpassant target square"""
+    bitm_enpassant_capturers:list[int] = None
+    """Raw bitboard values of squares a pawn must stand on to capture the enpassant target, indexed by target square"""
+
     """
     -----------------------------------------------
     """
@@ -380,6 +417,18 @@ class MoveCache(HashUtil):
 
         self.bitm_squares_light = light_squares
         self.bitm_squares_dark = dark_squares
+
+    def __init_between_masks(self):
+        """Walks each sliding direction from every square recording the squares passed on the way"""
+        self.bitm_between = [[0 for i in range(64)] for j in range(64)]
+
+        directions = self.moves_direction_r + self.moves_direction_b
+        for pos in range(64):
+            for direction in directions:
+                between = 0
+                for square in direction[pos]:
+                    self.bitm_between[pos][square] = between
+                    between |= 1 << square
         
 
     def __init_bit_masks(self):
@@ -387,22 +436,89 @@ class MoveCache(HashUtil):
         self.__init_square_bit_maps()
         self.__init_move_bit_masks()
         self.__init_color_masks()
+        self.__init_between_masks()
 
 
     def __init_hash(self):
-        random.seed = 8293449743051711766
-        len_hash = 2**64
+        if self.polyglot_keys:
+            self.__init_hash_polyglot()
+            return
+
+        #Use our own generator seeded with a fixed seed so keys are the same on every run and in every process
+        rng = random.Random(self.HASH_SEED)
         #Generate random for numbers for hashed pieces
-        self.hashes_white_pieces = [[c_uint64(random.randrange(0,len_hash)).value for pos in range(64)] for piece_type in range(6)]
-        self.hashes_black_pieces = [[c_uint64(random.randrange(0,len_hash)).value for pos in range(64)] for piece_type in range(6)]
-        self.hashes_castling_rights = [c_uint64(random.randrange(0,len_hash)).value for castle_right in range(16)]
-        self.hashes_enpassant_target = [c_uint64(random.randrange(0,len_hash)).value for file in range(8)]
-        self.hashes_turn = c_uint64(random.randrange(0,len_hash)).value
+        self.hashes_white_pieces = [[rng.getrandbits(64) for pos in range(64)] for piece_type in range(6)]
+        self.hashes_black_pieces = [[rng.getrandbits(64) for pos in range(64)] for piece_type in range(6)]
+        self.hashes_castling_rights = [rng.getrandbits(64) for castle_right in range(16)]
+        self.hashes_enpassant_target = [rng.getrandbits(64) for file in range(8)]
+        self.hashes_turn = rng.getrandbits(64)
+
+        self.__init_hash_deltas()
+        self.hash_key_version = self.__get_hash_key_version()
+
+    def __init_hash_polyglot(self):
+        """Loads keys from the polyglot random array"""
+        keys = POLYGLOT_RANDOM_ARRAY
+        #Polyglot squares start at a1 while our squares start at a8, flipping the rank converts between them
+        #Polyglot orders pieces black pawn, white pawn, black knight, ...
+        self.hashes_white_pieces = [[keys[64 * (2 * piece_type + 1) + (pos ^ 56)] for pos in range(64)] for piece_type in range(6)]
+        self.hashes_black_pieces = [[keys[64 * (2 * piece_type) + (pos ^ 56)] for pos in range(64)] for piece_type in range(6)]
+
+        #Castling rights hash is the XOR of the keys of each right that is set
+        #Polyglot order: white kingside, white queenside, black kingside, black queenside
+        castle_keys = [keys[769], keys[768], keys[771], keys[770]]
+        self.hashes_castling_rights = []
+        for castle_right in range(16):
+            hash = 0
+            for bit in range(4):
+                if castle_right & (1 << bit):
+                    hash ^= castle_keys[bit]
+            self.hashes_castling_rights.append(hash)
+
+        self.hashes_enpassant_target = keys[772:780]
+        self.hashes_turn = keys[780]
+        self.hash_turn_color = PieceColor.WHITE
+
+        self.__init_hash_deltas()
+        self.hash_key_version = self.__get_hash_key_version()
+
+    def __get_hash_key_version(self)->str:
+        """Key set version id, format followed by checksum of all keys"""
+        keys = self.get_hash_keys()
+        flat = [key for piece_keys in keys[0] + keys[1] for key in piece_keys] + keys[2] + keys[3] + [keys[4]]
+        checksum = zlib.crc32(b"".join(key.to_bytes(8,"little") for key in flat))
+        return f"{self.HASH_KEY_FORMAT}-{checksum:08x}"
+
+    def get_hash_keys(self)->tuple:
+        """
+        Returns the zobrist key set in format \n
+        (white piece keys, black piece keys, castling rights keys, enpassant file keys, turn key) \n
+        Can be pickled and passed to other processes or saved and loaded with set_hash_keys
+        """
+        return (self.hashes_white_pieces,self.hashes_black_pieces,self.hashes_castling_rights,self.hashes_enpassant_target,self.hashes_turn)
+
+    def set_hash_keys(self,keys:tuple)->None:
+        """Replaces the zobrist key set with one returned by get_hash_keys"""
+        self.hashes_white_pieces,self.hashes_black_pieces,self.hashes_castling_rights,self.hashes_enpassant_target,self.hashes_turn = keys
+
+        self.__init_hash_deltas()
+        self.hash_key_version = self.__get_hash_key_version()
+
+    def __init_hash_deltas(self):
+        """Builds XOR delta tables from the hashes so a move can be hashed with a handful of XORs"""
+        self.hashes_pieces = self.hashes_white_pieces + self.hashes_black_pieces
+
+        self.hashes_move_delta = [[[piece_hashes[pos_from] ^ piece_hashes[pos_to] for pos_to in range(64)] for pos_from in range(64)] for piece_hashes in self.hashes_pieces]
+        self.hashes_castling_delta = [[self.hashes_castling_rights[previous] ^ self.hashes_castling_rights[current] for current in range(16)] for previous in range(16)]
+        self.hashes_enpassant_square = [self.hashes_enpassant_target[self.map_file[pos]] for pos in range(64)]
+
+        #Pawns capturing enpassant stand on the same rank directly beside the target
+        self.bitm_enpassant_capturers = [self.bitm_moves_k[pos].value & self.bitm_ranks[self.map_ranks[pos]].value for pos in range(64)]
 
 
     def get_hash_turn(self,turn: int)->int:
-        """Hashes for turn, if it is black's turn return hash for black turn otherwise return None"""
-        if turn == PieceColor.BLACK:
+        """Hashes for turn, if turn is hashed for given color return hash for turn otherwise return None"""
+        if turn == self.hash_turn_color:
             return self.hashes_turn
 
     def get_hash_piece(self,piece_type: int, square: int, color: int)->int:
@@ -418,7 +534,8 @@ class MoveCache(HashUtil):
         file = self.map_file[target]
         return self.hashes_enpassant_target[file]
 
-    def __init__(self) -> None:
+    def __init__(self,polyglot_keys:bool = False) -> None:
+        self.polyglot_keys = polyglot_keys
         self.__init_arrays()
         self.__gen_piece_moves()
         self.__init_misc()
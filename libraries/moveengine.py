@@ -1,11 +1,17 @@
 from pseudomoves import *
 from hashing import ChessHashing
-from typing import Any
 import operator
-
-class PinType:
-    NORMAL = 0
-    ENPASSANT = 1
+from dataclasses import dataclass
+
+@dataclass
+class Pins:
+    """Pins on the king of the side to move"""
+    pinned:int
+    """Bitboard value of pieces pinned to king"""
+    rays:dict[int,int]
+    """Bitboard values of squares a pinned piece may move to (between king and pinner including pinner) indexed by position of pinned piece"""
+    enpassant_pinned:int
+    """Bitboard value of pawns that may not capture enpassant because it would expose king along it's rank"""
 
 class TerminalStatus:
     NotTerminal = 0
@@ -21,26 +27,36 @@ class MoveEngine:
 
     can_draw:bool = True
 
-    checkers_record:list[tuple[int,int]] = None
+    checkers_record:list[int] = None
     instruction_stack:list[MoveInstruction] = None
     move_stack:list[Move] = None
 
     #Hashed positions with number of time position has been visited
     reached_positions:list[int]= None
 
+    null_stack:list[tuple[int,int,int]] = None
+    """Enpassant target, half move clock and move stack length from before each null move made with move_null"""
+
     allow_null:bool = False
 
+    debug_hash:bool = False
+    """If true every incrementally updated hash is checked against a full hash of the board"""
+
+    SEE_PIECE_VALUES = PieceType.VALUES
+    """Piece values used for static exchange evaluation, indexed by piece type"""
+
     @property
     def current_hash(self)->int:
         return self.reached_positions[-1]
 
     @property
-    def checkers(self)->list[tuple[int,int]]:
+    def checkers(self)->int:
+        """Bitboard value of the pieces giving check to the side to move"""
         return self.checkers_record[-1]
 
     @property
     def in_check(self)->bool:
-        return len(self.checkers) > 0
+        return self.checkers != 0
 
     @property
     def turn(self)->int:
@@ -52,6 +68,10 @@ class MoveEngine:
             self.movestack = movestack
             super().__init__(msg)
 
+    class HashException(Exception):
+        """Exception to raise when incremental hash does not match hash of board"""
+        pass
+
     @property
     def legal_mode(self)->bool:
         """
@@ -101,379 +121,209 @@ class MoveEngine:
         return (self.cache.map_diagonals[pos],self.cache.map_off_diagonals[pos])
 
 
-    def __mask_scan(self,bb:Bitboard,bitm:Bitboard,forward:bool)->int:
-        """
-        Applies a mask to given bitboard. If this is 0 returns None otherwise performs 
-        the requested bitscan (either forward or reverse) and returns value
-        """
-        masked = Bitboard(bb.value & bitm.value)
-        if masked.value == 0: return None
-        if forward: return Bitboard.bitscan_forward(masked)
-        return Bitboard.bitscan_reverse(masked)
-
-    def __pin_mask_scan(self,bb:Bitboard,bitm:Bitboard,king_pos:int,attacker_pos:int):
-        """
-        Used to scan for pins on king.
-        Returns index of pinned piece
-        Note currently includes enemy pieces as pinned targets.
-        This is ok for now
-        """
-
-        #Apply line mask and mask out anything behind king
-
-        #Mask out everything behind king with shift mask
-        if king_pos > attacker_pos:
-            shift_mask = ~(bitm.value << (king_pos - attacker_pos))
-        else:
-            shift_mask = ~(bitm.value >> (attacker_pos - king_pos))
-
-        #Now apply both masks to get just the the king and it's defenders
-        masked = Bitboard((bb.value & bitm.value) & shift_mask)
-
-
-        #Line mask does not include attacker so if we remove king only the pieces in the way remain
-        #Remove king
-        masked.unset(king_pos)
-
-        #King must be in check if we have 0 here, return none because no piece is pinned just king in check
-        if masked.value == 0: return None
-
-        #Scan and get piece in the way
-        #Can use bitscan forward or reverse, doesn't matter 
-        #Currently, bitscan reverse is faster so use bitscan reverse
-        hit1 = Bitboard.bitscan_reverse(masked)
-        
-        #Remove piece
-        masked.unset(hit1)
-
-
-        # Now that this "defender" is removed if we are pinned no pieces are in the way
-        # Therefore our mask value is 0 if we are pinned
-        if masked.value == 0: return hit1
-
-
-        return None
-
-    
-    
-    def __pin_scan(self,line_type:int,king_pos:int,attacker_pos:int,attacker_line_position:int)->tuple[int,int,int,int]:
+    def get_pins(self)->Pins:
         """
-        Scans for pins. Returns a tuple in the following format\n
-        (pinned piece position, pinned line type, pinned line position, pintype)\n
-        pinned line type - 0 for ranks, 1 for files, 2 for diagonals 3 for off diagonals\n
-        pinned line position - the number coresponding to the ranks/file/diagonal/..
-        the piece is pinned to. More info in MoveCache class.\n
-        PinType - 0 for normal pins 1 for pins preventing enpassant
+        Returns the pins on the king of the side to move, found with x-ray attacks from the king. \n
+        If not in legal mode returns no pins \n
         """
-        assert line_type >= 0 and line_type < 4
+        pins = Pins(0,{},0)
+        if not self.__legal_mode:
+            return pins
 
+        board = self.board
         cache = self.cache
+        pieces = board.pieces
+        attacker_color = PieceColor.reverse_color(board.turn)
 
-        bitm_attack = None
-        if line_type == 0:
-            #Look at ranks
-            #If king pos is greater than the attacker position the king is to the east
-            if king_pos > attacker_pos:
-                bitm_attack = cache.bitm_moves_slide_e[attacker_pos]
-            else:
-                bitm_attack = cache.bitm_moves_slide_w[attacker_pos]
-        elif line_type == 1:
-            #Looking at files
-            #If king pos is greater than the attacker position the king is to the south
-            if king_pos > attacker_pos:
-                bitm_attack = cache.bitm_moves_slide_s[attacker_pos]
-            else:
-                bitm_attack = cache.bitm_moves_slide_n[attacker_pos]
-        elif line_type == 2:
-            #looking at diagonals
-            #Diagonals go from sw to ne
-            #If king pos is greater than attacker position the king is to the south west
-            if king_pos > attacker_pos:
-                bitm_attack = cache.bitm_moves_slide_sw[attacker_pos]
-            else:
-                bitm_attack = cache.bitm_moves_slide_ne[attacker_pos]
-        else: 
-            #Looking at anti diagonals
-            #Anti diagonals go from se to nw
-            #If king pos is greater than attacker position the king is to the south east
-            if king_pos > attacker_pos:
-                bitm_attack = cache.bitm_moves_slide_se[attacker_pos]
-            else:
-                bitm_attack = cache.bitm_moves_slide_nw[attacker_pos]
-        
-        #Finnaly do our pin scan
-        scan_result = self.__pin_mask_scan(self.board.squares,bitm_attack,king_pos,attacker_pos)
-
-        #Record pin information
-        pin_info = (scan_result,line_type,attacker_line_position,PinType.NORMAL)
+        king_pos = self.get_king_pos(board.turn)
+        occupancy = board.squares.value
+        own = board.squares_color[board.turn].value
+
+        offset = board.get_list_pos(attacker_color,0)
+        rooks_queens = pieces[offset + PieceType.ROOK].value | pieces[offset + PieceType.QUEEN].value
+        bishops_queens = pieces[offset + PieceType.BISHOP].value | pieces[offset + PieceType.QUEEN].value
+
+        #Look from the king as if it were a slider, remove our own pieces that block it and look again
+        #Any enemy slider that appears behind a removed piece pins that piece
+        pinners = 0
+        if rooks_queens != 0:
+            attacks = self.__rook_attacks(king_pos,occupancy)
+            pinners |= (attacks ^ self.__rook_attacks(king_pos,occupancy ^ (attacks & own))) & rooks_queens
+        if bishops_queens != 0:
+            attacks = self.__bishop_attacks(king_pos,occupancy)
+            pinners |= (attacks ^ self.__bishop_attacks(king_pos,occupancy ^ (attacks & own))) & bishops_queens
+
+        between = cache.bitm_between[king_pos]
+        while pinners != 0:
+            pinner = BitTwiddle.lsb(pinners)
+            pinners &= pinners - 1
+
+            #Pinned piece may move between king and pinner or capture pinner
+            ray = between[pinner]
+            pinned = ray & own
+            pins.pinned |= pinned
+            pins.rays[BitTwiddle.lsb(pinned)] = ray | (1 << pinner)
 
         #Special case enpassant horizontal pin
-        #Special case cannot happen for pins that are not rank pins
-        #If there is no enpassant target
-        #Or if we already found a pin
-        if line_type != 0 or self.board.enpassant_target == None or scan_result != None:
-            return pin_info
-            
-        #Check if we are on same rank as enpassant target
-        rank_ep = cache.map_ranks[self.board.enpassant_target]
-        
-        if rank_ep != attacker_line_position:
-            return pin_info
+        #capturing enpassant removes two pieces from the rank at once, neither is pinned on it's own
+        target = board.enpassant_target
+        if target == None or cache.map_ranks[target] != cache.map_ranks[king_pos] or rooks_queens == 0:
+            return pins
 
-        #Ok we have possible enpassant pin case
-        #we must rescan with but with enpassant target removed
-        squares_target_removed = Bitboard(self.board.squares.value)
-        squares_target_removed.unset(self.board.enpassant_target)
+        #Pawns of ours that are beside enpassant target and could capture it
+        capturers = cache.bitm_enpassant_capturers[target] & board.get_board_piece(board.turn,PieceType.PAWN).value
 
-        scan_result2 = self.__pin_mask_scan(squares_target_removed,bitm_attack,king_pos,attacker_pos)
-        
-        if scan_result2 == None:
-            return pin_info
-        
-        #Ensure the pinned piece is a pawn
-        pawn_board = self.board.get_board_piece(self.turn,PieceType.PAWN)
-        if not pawn_board.occupied(scan_result2):
-            return pin_info
-
-        #Ensure the pawn can capture enpassant
-        if (not self.board.enpassant_target + 1 == scan_result2) and (not self.board.enpassant_target - 1 == scan_result2):
-            return pin_info
+        while capturers != 0:
+            pawn = BitTwiddle.lsb(capturers)
+            capturers &= capturers - 1
 
-        #Ok we have special case, report pin as a pin in the vertical direction
-        #so our pawn may not capture enpassant
-        return (scan_result2,0,attacker_line_position,PinType.ENPASSANT)
+            #Remove both pawns and look along the rank for rooks and queens
+            removed = occupancy & ~(1 << pawn) & ~(1 << target)
+            rank_attacks = (self.__ray_attacks(cache.bitm_moves_slide_e,king_pos,removed,True) |
+                            self.__ray_attacks(cache.bitm_moves_slide_w,king_pos,removed,False))
+            if rank_attacks & rooks_queens != 0:
+                pins.enpassant_pinned |= 1 << pawn
 
-            
-        
+        return pins
 
-    def __get_pins_rook(self,kingpos,rook_locations,king_rank,king_file):
+    def square_attacked(self,color:int,pos:int,remove_king:bool = False)->bool:
         """
-        Loops throught provided rooks positions, finds pins. Returns a list of pins in format: \n
-        (pinned piece, pinned line type (2 for diagonals, 3 for off diagonals) , (diagonal positon (1 - 14))) \n
-        For more information on diagonal position see move cache \n
+        Checks if square is attacked by pieces of a given color
+        must be in legal mode to call, with remove_king set to true
         """
-        pin_list:list[tuple[int,int]] = []
+        if remove_king and not self.__legal_mode:
+            raise self.__legal_exception("Cannon call square attacked with legal mode turned off if remove king is set to true")
 
-        #TODO need to add in code to fix "enpassant bug"
+        occupancy = self.board.squares.value
+        #Remove king so sliders attack through it
+        if remove_king:
+            occupancy &= ~(1 << self.get_king_pos(self.board.turn))
 
-        for rook_pos in rook_locations:
-            rook_rank,rook_file = self.__get_piece_rank_file(rook_pos) 
-            
-            if rook_rank == king_rank:
-                pin = self.__pin_scan(0,kingpos,rook_pos,rook_rank)
-                if pin[0] != None: pin_list.append(pin)
-            
-            elif rook_file == king_file:
-                pin = self.__pin_scan(1,kingpos,rook_pos,rook_file)
-                if pin[0] != None: pin_list.append(pin)
-        return pin_list
+        return (self.attackers_to(pos,occupancy) & self.board.squares_color[color].value) != 0
 
-    def __get_pins_bishop(self,kingpos,bishop_locations,king_diagonal,king_off_diagonal):
+    def __ray_attacks(self,rays:list[Bitboard],pos:int,occupancy:int,forward:bool)->int:
         """
-        Loops throught provided bishop positions, finds pins. Returns a list of pins in format: \n
-        (pinned piece, pinned line type (2 for diagonals, 3 for off diagonals) , (diagonal positon (1 - 14))) \n
-        For more information on diagonal position see move cache \n
+        Attacks along a single ray from pos for the given occupancy, the first blocker is included. \n
+        forward - true if ray goes in direction of increasing indicies (closest blocker is least significant bit)
         """
-        pin_list:list[tuple[int,int]] = []
-
-        for bishop_pos in bishop_locations:
-            #look up the bishop diagonal and off diagonal
-            bishop_diag,bishop_off_diag = self.__get_piece_diag_off_diag(bishop_pos) 
-            
-            #The bishop may only pin if it is on the same diagonal or off diagonal as king
-            if bishop_diag == king_diagonal:
-                #We are on same diagonal scan for pin
-                pin = self.__pin_scan(2,kingpos,bishop_pos,bishop_diag)
-                #Add to pins if we have found a pint
-                if pin[0] != None: pin_list.append(pin)
-
-            elif bishop_off_diag == king_off_diagonal:
-                pin = self.__pin_scan(3,kingpos,bishop_pos,bishop_off_diag)
-                if pin[0] != None: pin_list.append(pin)
-        
-        return pin_list
-
-
-    def get_pins(self)->list[tuple[int,int,int]]:
-        """Returns a list of pins in the following format \n
-        (pinned piece, pinned line type (0 for rank 1 for file, 2 for diagonals, 3 for off diagonals) , (line position) \n
-        If not in legal mode returns empty list \n
-        """
-        if not self.__legal_mode:
-            return []
-
-        board = self.board
+        ray = rays[pos].value
+        blockers = ray & occupancy
+        if blockers == 0: return ray
+        blocker = BitTwiddle.lsb(blockers) if forward else BitTwiddle.msb(blockers)
+        #Remove everything behind the blocker
+        return ray ^ rays[blocker].value
+
+    def __rook_attacks(self,pos:int,occupancy:int)->int:
+        """Rook attacks from pos for an arbitrary occupancy"""
         cache = self.cache
-        attacker_color = PieceColor.reverse_color(board.turn)
-
-        #Pieces that pin king must be on the same diagonal or off diagonal
-        king_pos = self.get_king_pos(self.board.turn)
-
-        king_rank, king_file = self.__get_piece_rank_file(king_pos)
-        king_diag, king_off_diag = self.__get_piece_diag_off_diag(king_pos)
-
-        attack_rooks = board.get_locations_piece(attacker_color,PieceType.ROOK)
-        attack_bishops = board.get_locations_piece(attacker_color,PieceType.BISHOP)
-        attack_queens = board.get_locations_piece(attacker_color,PieceType.QUEEN)
-
-
-        pins = []
+        return (self.__ray_attacks(cache.bitm_moves_slide_n,pos,occupancy,False) |
+                self.__ray_attacks(cache.bitm_moves_slide_w,pos,occupancy,False) |
+                self.__ray_attacks(cache.bitm_moves_slide_s,pos,occupancy,True) |
+                self.__ray_attacks(cache.bitm_moves_slide_e,pos,occupancy,True))
 
-        #Calculate pins for rooks and bishops, add queens to both because queens have the same 
-        #Attacks of queen are just union of bishop and rook attacks so we can take care of both at same time
-        pins += self.__get_pins_rook(king_pos,attack_rooks + attack_queens,king_rank,king_file)
-
-        pins += self.__get_pins_bishop(king_pos,attack_bishops + attack_queens,king_diag,king_off_diag)
-
-        return pins
-
-    def __get_pieces_board(self,board:Bitboard,piece_type:int):
-        
-        pieces = []
-
-        #Scans until all pieces on board have been discovered
-        while 1:
-            if board.value == 0:
-                break
-            piece = Bitboard.bitscan_reverse(board)
-            pieces.append((piece,piece_type))
-            board.unset(piece)
-
-        return pieces
-
-    def __non_slider_attacking(self,attacks:Bitboard,attacker_board:Bitboard,piece_type:int,get_attackers:bool = False)->Any:
-        result = Bitboard(attacks.value & attacker_board.value)
-        if not get_attackers: return result.value != 0
-        #Get pieces if requested
-        return self.__get_pieces_board(result,piece_type) 
-
-    def __knight_attacking_square(self,color:int,pos:int,get_attackers:bool = False)->Any:
-        """Checks if knight is attacking a given position"""
-        n_attack_board = self.board.get_board_piece(color,PieceType.KNIGHT)
-        #If any knight is on a square that is attacking our square return true
-        return self.__non_slider_attacking(self.cache.bitm_moves_n[pos],n_attack_board,PieceType.KNIGHT,get_attackers)
-
-    def __king_attacking_square(self,color:int,pos:int,get_attackers:bool = False)->Any:
-        """Checks if king is attacking a given position"""
-        k_attack_board = self.board.get_board_piece(color,PieceType.KING)
-        return self.__non_slider_attacking(self.cache.bitm_moves_k[pos],k_attack_board,PieceType.KING,get_attackers)
-
-    def __pawn_attacking_square(self,color:int,pos:int,get_attackers:bool = False)->Any:
-        """Checks if a pawn is attacking a given position"""
-        p_attack_board = self.board.get_board_piece(color,PieceType.PAWN)
-        p_attacks = self.cache.bitm_moves_p_a_w[pos] if color == PieceColor.BLACK else self.cache.bitm_moves_p_a_b[pos]
-        return self.__non_slider_attacking(p_attacks,p_attack_board,PieceType.PAWN,get_attackers)
-
-
-    def __slider_attacking_square(self,color:int,pos:int,get_attackers:bool = False,remove:int = None)->Any:
-        """Returns true if a slider is attacking the square in a given direction"""
-        
+    def __bishop_attacks(self,pos:int,occupancy:int)->int:
+        """Bishop attacks from pos for an arbitrary occupancy"""
         cache = self.cache
-        squares = Bitboard(self.board.squares.value)
-
-        if remove != None: squares.unset(remove)
+        return (self.__ray_attacks(cache.bitm_moves_slide_ne,pos,occupancy,False) |
+                self.__ray_attacks(cache.bitm_moves_slide_nw,pos,occupancy,False) |
+                self.__ray_attacks(cache.bitm_moves_slide_sw,pos,occupancy,True) |
+                self.__ray_attacks(cache.bitm_moves_slide_se,pos,occupancy,True))
 
+    def attackers_to(self,pos:int,occupancy:int)->int:
         """
-        Why bitscan forward / reverse?
-        We want hit that is closest to the piece at a position.
-        If we are going in direction of increasing indicies bitscan reverse gives that information to us
-        if we are going in direction of decreasing indicies bitscan forward gives us that information
+        Returns bitboard value of all pieces of both colors attacking pos. \n
+        Sliders are blocked according to the given occupancy, which does not need to match the board.
+        This allows x-rays to be found by removing pieces from the occupancy. \n
+        Pieces not in the occupancy are still included, mask with occupancy to exclude them.
         """
-        a_rook_board = self.board.get_board_piece(color,PieceType.ROOK)
-        a_bishop_board = self.board.get_board_piece(color,PieceType.BISHOP)
-        a_queen_board = self.board.get_board_piece(color,PieceType.QUEEN)
-
-        attackers = []
-
-        #Check the hits
-        #If our row/collumn scan hits a rook or queen our square is being attacked 
-        #if our diagonal / antidiagonal scan hits a bisop or queen our square is bieng attacked
-        def check_rook(hit):
-            if hit == None:return False
-
-            if a_rook_board.occupied(hit):
-                #Record attackers if requested
-                if get_attackers:
-                    attackers.append((hit,PieceType.ROOK))
-                    #Return false here so we may continue search
-                    return False
-                return True
-            if a_queen_board.occupied(hit):
-                if get_attackers:
-                    attackers.append((hit,PieceType.QUEEN))
-                    return False
-                return True
-            return False
-
-        def check_bishop(hit):
-            if hit == None:return False
-            if a_bishop_board.occupied(hit): 
-                if get_attackers:
-                    attackers.append((hit,PieceType.BISHOP))
-                    return False
-                return True
-            if a_queen_board.occupied(hit):
-                if get_attackers:
-                    attackers.append((hit,PieceType.QUEEN))
-                    return False
-                return True
-            return False
-        
-        #Bitscan in the 4 row / collumn direction
-        if check_rook(self.__mask_scan(squares,cache.bitm_moves_slide_n[pos],False)): return True
-        if check_rook(self.__mask_scan(squares,cache.bitm_moves_slide_w[pos],False)): return True
-        if check_rook(self.__mask_scan(squares,cache.bitm_moves_slide_s[pos],True)): return True
-        if check_rook(self.__mask_scan(squares,cache.bitm_moves_slide_e[pos],True)): return True
+        cache = self.cache
+        pieces = self.board.pieces
+        #Offset of black pieces in board piece list
+        b = 6
+
+        rooks_queens = pieces[PieceType.ROOK].value | pieces[PieceType.QUEEN].value | pieces[b + PieceType.ROOK].value | pieces[b + PieceType.QUEEN].value
+        bishops_queens = pieces[PieceType.BISHOP].value | pieces[PieceType.QUEEN].value | pieces[b + PieceType.BISHOP].value | pieces[b + PieceType.QUEEN].value
+
+        #White pawns attacking pos stand where a black pawn on pos would attack and vice versa
+        attackers = cache.bitm_moves_p_a_b[pos].value & pieces[PieceType.PAWN].value
+        attackers |= cache.bitm_moves_p_a_w[pos].value & pieces[b + PieceType.PAWN].value
+        attackers |= cache.bitm_moves_n[pos].value & (pieces[PieceType.KNIGHT].value | pieces[b + PieceType.KNIGHT].value)
+        attackers |= cache.bitm_moves_k[pos].value & (pieces[PieceType.KING].value | pieces[b + PieceType.KING].value)
+        if rooks_queens != 0:
+            attackers |= self.__rook_attacks(pos,occupancy) & rooks_queens
+        if bishops_queens != 0:
+            attackers |= self.__bishop_attacks(pos,occupancy) & bishops_queens
 
+        return attackers
 
-        #Bitscan in the 4 diagonal directions
-        if check_bishop(self.__mask_scan(squares,cache.bitm_moves_slide_ne[pos],False)): return True
-        if check_bishop(self.__mask_scan(squares,cache.bitm_moves_slide_nw[pos],False)): return True
-        if check_bishop(self.__mask_scan(squares,cache.bitm_moves_slide_sw[pos],True)): return True
-        if check_bishop(self.__mask_scan(squares,cache.bitm_moves_slide_se[pos],True)): return True
+    def see(self,move:Move)->int:
+        """
+        Static exchange evaluation - https://www.chessprogramming.org/Static_Exchange_Evaluation \n
+        Returns the material balance (centipawns) for the side to move after all captures on the destination
+        square are played out, each side always capturing with it's least valuable attacker.
+        X-ray attackers uncovered by earlier captures are included. Must be called before the move is made.
+        """
+        board = self.board
+        pieces = board.pieces
+        squares_color = board.squares_color
+        values = self.SEE_PIECE_VALUES
+        target = move.pos_to
+
+        #Remove moving piece, uncovering any x-ray attackers behind it
+        occupancy = board.squares.value & ~(1 << move.pos_from)
+        if move.move_type == MoveType.ENPASSANT:
+            occupancy &= ~(1 << move.caputre_pos)
+
+        gain = [values[move.capure_piece] if move.capture else 0]
+
+        attackers = self.attackers_to(target,occupancy) & occupancy
+        on_square = move.piece
+        color = PieceColor.reverse_color(board.turn)
+
+        while True:
+            side_attackers = attackers & squares_color[color].value
+            if side_attackers == 0: break
+
+            #Find least valuable attacker
+            offset = 0 if color == PieceColor.WHITE else 6
+            for piece_type in range(6):
+                lva = side_attackers & pieces[offset + piece_type].value
+                if lva != 0: break
+
+            #King may not recapture on a square that is still defended
+            if piece_type == PieceType.KING and (attackers & squares_color[PieceColor.reverse_color(color)].value) != 0:
+                break
 
-        if get_attackers: return attackers
+            #Gain if capture is made and nothing is recaptured
+            gain.append(values[on_square] - gain[-1])
 
-        return False
+            #Remove attacker and add any x-ray attackers behind it
+            occupancy ^= lva & -lva
+            if piece_type == PieceType.PAWN or piece_type == PieceType.BISHOP or piece_type == PieceType.QUEEN:
+                attackers |= self.__bishop_attacks(target,occupancy) & (pieces[PieceType.BISHOP].value | pieces[PieceType.QUEEN].value | pieces[6 + PieceType.BISHOP].value | pieces[6 + PieceType.QUEEN].value)
+            if piece_type == PieceType.ROOK or piece_type == PieceType.QUEEN:
+                attackers |= self.__rook_attacks(target,occupancy) & (pieces[PieceType.ROOK].value | pieces[PieceType.QUEEN].value | pieces[6 + PieceType.ROOK].value | pieces[6 + PieceType.QUEEN].value)
+            attackers &= occupancy
 
-    def square_attacked(self,color:int,pos:int,get_attackers = False,remove_king:bool = False):
-        """
-        Checks if square is attacked by pieces of a given color
-        must be in legal mode to call, with remove_king set to true
-        """
-        if remove_king and not self.__legal_mode:
-            raise self.__legal_exception("Cannon call square attacked with legal mode turned off if remove king is set to true")
+            on_square = piece_type
+            color = PieceColor.reverse_color(color)
 
-        remove = self.get_king_pos(self.board.turn) if remove_king else None
-        
-        #Check if the given pieces are attacking square
-        if not get_attackers:
-            #If we are not getting attackers we can simply return after one hit
-            if self.__knight_attacking_square(color,pos,False): 
-                return True
-            if self.__pawn_attacking_square(color,pos,False): 
-                return True
-            if self.__king_attacking_square(color,pos,False): 
-                return True
-            if self.__slider_attacking_square(color,pos,False,remove): 
-                return True
-            return False
-        
-        #Get attackers if requested, add attackers to list
-        attackers = []
-        attackers +=  self.__knight_attacking_square(color,pos,True)
-        attackers += self.__pawn_attacking_square(color,pos,True)
-        attackers += self.__king_attacking_square(color,pos,True)
-        attackers += self.__slider_attacking_square(color,pos,True,remove)
+        #Negamax the speculative gains back to the first capture, each side may stop capturing
+        while len(gain) > 1:
+            last = gain.pop()
+            gain[-1] = -max(-gain[-1],last)
 
-        return attackers
+        return gain[0]
 
-    def __get_checkers(self,color)->list[tuple,tuple]:
+    def __get_checkers(self,color)->int:
+        """Bitboard value of pieces giving check to king of given color"""
         if not self.legal_mode:
             raise self.__legal_exception("Cannot get checkers if not in legal mode")
             
         king_pos = self.get_king_pos(color)
-        return self.square_attacked(PieceColor.reverse_color(color),king_pos,True)
+        board = self.board
+        attacker_color = PieceColor.reverse_color(color)
+        return self.attackers_to(king_pos,board.squares.value) & board.squares_color[attacker_color].value
 
     def __posible_check(self,move:Move)->None:
         if not self.legal_mode:
@@ -547,33 +397,11 @@ class MoveEngine:
         if move == None or (not move.null and self.__posible_check(move)):
             checkers = self.__get_checkers(self.board.turn)
         else:
-            checkers = []
+            checkers = 0
         
         self.checkers_record.append(checkers)
 
-    def __possible_block(self,move:Move,checker_pos:int,king_pos:int)->bool:
-        """Returns true if the move is moving on the same rank, file, diagonal or off diagonal as the checker"""
-
-        move_rank, move_file = self.__get_piece_rank_file(move.pos_to)
-        move_diag, move_offdiag = self.__get_piece_diag_off_diag(move.pos_to)
-
-        checker_rank, checker_file = self.__get_piece_rank_file(checker_pos)
-        checker_diag, checker_offdiag = self.__get_piece_diag_off_diag(checker_pos)
-
-        king_rank, king_file = self.__get_piece_rank_file(king_pos)
-        king_diag, king_offdiag = self.__get_piece_diag_off_diag(king_pos)
-
-        if move_rank == checker_rank and move_rank == king_rank:
-            return True
-        if move_file == checker_file and move_file == king_file:
-            return True
-        if move_diag == checker_diag and move_diag == king_diag:
-            return True
-        if move_offdiag == checker_offdiag and move_offdiag == king_offdiag:
-            return True
-
-
-    def __in_check_move_legal(self,move:Move,pinned_pos:list[int],pins:list[tuple[int,int,int]])->bool:
+    def __in_check_move_legal(self,move:Move,pins:Pins)->bool:
         """Special move test function for when we are in check"""
         #Permited moves in check
         #    (a) - move out of check
@@ -593,7 +421,7 @@ class MoveEngine:
 
         #Moving king is always a posibiliy
         if move.piece == PieceType.KING:
-            square_attacked =  self.square_attacked(attacker_color,move.pos_to,get_attackers=False,remove_king=True)
+            square_attacked =  self.square_attacked(attacker_color,move.pos_to,remove_king=True)
             return not square_attacked
 
 
@@ -601,48 +429,32 @@ class MoveEngine:
 
         #If we are in double check we must move king
         checkers = self.checkers
-        if len(checkers) > 1: return False
+        if checkers & (checkers - 1) != 0: return False
 
         
-        #Moving a piece that is pinned will not help us here unless it just enpassant pin
-        if move.pos_from in pinned_pos:
-            ind = pinned_pos.index(move.pos_from)
-            pin_info = pins[ind]
-
-            if pin_info[3] == PinType.NORMAL: return False
-            #Enpassant pin case
-            if move.move_type == MoveType.ENPASSANT: return False
+        #Moving a piece that is pinned will not help us here
+        from_mask = 1 << move.pos_from
+        if pins.pinned & from_mask != 0: return False
+        #Enpassant pin case
+        if move.move_type == MoveType.ENPASSANT and pins.enpassant_pinned & from_mask != 0: return False
         
 
 
-        checker_pos,checker_piece = checkers[0]
+        checker_pos = BitTwiddle.lsb(checkers)
 
         #Capturing checker is posibility
         if move.capture and move.caputre_pos == checker_pos: return True
 
-        
-        # if piece is not sliding and we are not capturing piece move is invalid
-        if checker_piece == PieceType.PAWN or checker_piece == PieceType.KNIGHT: False
-
         king_pos = self.get_king_pos(self.board.turn)
         
         #We have elimated all other posibilities only possibility left is to block
-        possible_block = self.__possible_block(move,checker_pos,king_pos)
-
-        #Blocking not possible
-        if not possible_block: return False
-
-        #Ensure we are moving between the sliding piece and king
-
-        if move.pos_to < king_pos and move.pos_to > checker_pos: return True
-        if move.pos_to > king_pos and move.pos_to < checker_pos: return True
-        
-        #We have moved to right, rank / file / diagonal to block but we are not blocking
-        return False
+        #Squares between king and checker, empty if checker is not a sliding piece
+        block_mask = self.cache.bitm_between[king_pos][checker_pos]
+        return (block_mask >> move.pos_to) & 1 == 1
 
 
     
-    def move_legal(self,move:Move,pinned_pos:list[int],pins:list[tuple[int,int,int]])->bool:
+    def move_legal(self,move:Move,pins:Pins)->bool:
         """
         Move legality test, assumes move is pseudo legal
         Null move always returns false, however it may still be passed even if legal mode is on
@@ -656,26 +468,17 @@ class MoveEngine:
 
 
 
-        cache = self.cache
         turn = self.board.turn
         attacker_color = PieceColor.reverse_color(turn)
 
-        if self.in_check: return self.__in_check_move_legal(move,pinned_pos,pins)
+        if self.in_check: return self.__in_check_move_legal(move,pins)
 
-        if move.pos_from in pinned_pos:
-            #Piece is pinned, we may not move it off of it's pinned direction
-            ind = pinned_pos.index(move.pos_from)
-            pin_info = pins[ind]
-
-            if pin_info[3] == PinType.NORMAL:
-                #Cache stores a list of ranks, files, diagonals... look up what rank / file/.. we are trying to move to an ensure
-                #That it is the same one we are pinned to
-                new_line = cache.map_line_labels[pin_info[1]][move.pos_to]
-                #If we are moving off of pinned line go to next move
-                if new_line != pin_info[2]: return False
-            else:
-                #Special case enpassant pin
-                if move.move_type == MoveType.ENPASSANT: return False
+        from_mask = 1 << move.pos_from
+        if pins.pinned & from_mask != 0:
+            #Piece is pinned, we may not move it off of it's pinned ray
+            if (pins.rays[move.pos_from] >> move.pos_to) & 1 == 0: return False
+        #Special case enpassant pin
+        if move.move_type == MoveType.ENPASSANT and pins.enpassant_pinned & from_mask != 0: return False
 
         #One may not move his / her / their king into check
         if move.piece == PieceType.KING:
@@ -705,9 +508,8 @@ class MoveEngine:
     def __get_legal(self,pseudo_moves:list[Move])->list[Move]:
         """Checks a list of pseudo legal moves and returns legality of the moves"""
         pins = self.get_pins()
-        pinned_pos = [pin[0] for pin in pins]
 
-        return [move for move in pseudo_moves if self.move_legal(move,pinned_pos,pins)]
+        return [move for move in pseudo_moves if self.move_legal(move,pins)]
 
     def get_moves(self)->list[Move]:
         """Returns a list of legal moves from the position"""
@@ -759,14 +561,106 @@ class MoveEngine:
         """
         Incremental update to hash
         using fact that XOR is it's own inverse
-        https://www.chessprogramming.org/Zobrist_Hashing
+        https://www.chessprogramming.org/Zobrist_Hashing \n
+        Same result as ChessHashing.update_instruction, but uses the precomputed XOR deltas in the move cache
         """
-        hash = ChessHashing.update_instruction(self.reached_positions[-1],self.cache,instruction)
+        cache = self.cache
+        hash = self.reached_positions[-1]
+
+        if not instruction.null:
+            list_pos = 6 * instruction.move_from_color
+
+            if instruction.move_from_piece == instruction.move_to_piece:
+                #Remove piece from square we are moving from and add it to the square we are moving to
+                hash ^= cache.hashes_move_delta[list_pos + instruction.move_from_piece][instruction.move_from][instruction.move_to]
+            else:
+                #Promotion, piece changes type
+                hash ^= cache.hashes_pieces[list_pos + instruction.move_from_piece][instruction.move_from]
+                hash ^= cache.hashes_pieces[list_pos + instruction.move_to_piece][instruction.move_to]
+
+            if instruction.capture:
+                hash ^= cache.hashes_pieces[6 * instruction.capture_color + instruction.capture_piece][instruction.capture_pos]
+            elif instruction.castle:
+                hash ^= cache.hashes_move_delta[list_pos + PieceType.ROOK][instruction.rook_pos_from][instruction.rook_pos_to]
+
+        hash ^= cache.hashes_castling_delta[instruction.castling_rights_previous.value][instruction.castling_rights_current.value]
+
+        previous = instruction.enpassant_target_previous
+        current = instruction.enpassant_target_current
+        if cache.polyglot_keys:
+            #Polyglot only hashes enpassant targets a pawn of the side to move can capture
+            #Board has already been moved, recover the mover's pawns from before the move to check previous target
+            if previous != None:
+                pawns = self.board.get_board_piece(instruction.move_from_color,PieceType.PAWN).value
+                if not instruction.null:
+                    if instruction.move_to_piece == PieceType.PAWN: pawns &= ~(1 << instruction.move_to)
+                    if instruction.move_from_piece == PieceType.PAWN: pawns |= 1 << instruction.move_from
+                if not ChessHashing.enpassant_capturable(cache,previous,pawns):
+                    previous = None
+            if current != None and not ChessHashing.enpassant_capturable(cache,current,self.board.get_board_piece(self.board.turn,PieceType.PAWN).value):
+                current = None
+
+        if previous != None:
+            hash ^= cache.hashes_enpassant_square[previous]
+        if current != None:
+            hash ^= cache.hashes_enpassant_square[current]
+
+        #Advance turn
+        hash ^= cache.hashes_turn
+
+        if self.debug_hash:
+            full_hash = ChessHashing.hash(cache,self.board)
+            if hash != full_hash:
+                raise self.HashException(f"Incremental hash {hash} does not match full hash {full_hash}, Movestack: {self.move_stack}")
+
         self.reached_positions.append(hash)
 
 
         
 
+    def move_null(self):
+        """
+        Passes the turn without going through MoveProcessor, only the side to move, enpassant target and clocks change. \n
+        Much cheaper than move(MoveProcessor.NULL_MOVE), must be undone with unmove_null
+        """
+        if not self.allow_null:
+            raise self.__legal_exception("Null move was passed when null moves are disabled")
+        if self.legal_mode and self.in_check:
+            raise self.__legal_exception("Null move cannot be passed when in check if legal mode is on")
+
+        board = self.board
+        #Remove enpassant target from hash while the side that could capture it is still to move
+        hash = ChessHashing.hash_enpassant(self.current_hash,self.cache,board) ^ self.cache.hashes_turn
+
+        self.null_stack.append((board.enpassant_target,board.half_move,len(self.move_stack)))
+        board.enpassant_target = None
+        board.half_move += 1
+        if board.turn == PieceColor.BLACK:
+            board.full_move += 1
+        board.turn = PieceColor.reverse_color(board.turn)
+
+        if self.debug_hash:
+            full_hash = ChessHashing.hash(self.cache,board)
+            if hash != full_hash:
+                raise self.HashException(f"Null move hash {hash} does not match full hash {full_hash}, Movestack: {self.move_stack}")
+
+        self.reached_positions.append(hash)
+        self.move_stack.append(MoveProcessor.NULL_MOVE)
+        #Side that passed was not giving check, so the side to move is not in check
+        self.checkers_record.append(0)
+
+    def unmove_null(self):
+        """Undoes null move made with move_null"""
+        board = self.board
+        board.turn = PieceColor.reverse_color(board.turn)
+        if board.turn == PieceColor.BLACK:
+            board.full_move -= 1
+        board.enpassant_target, board.half_move, _ = self.null_stack.pop()
+
+        del self.checkers_record[-1]
+        del self.move_stack[-1]
+        del self.reached_positions[-1]
+
     def unmove(self):
         """Undoes last move in stack."""
         self.board.undo(self.instruction_stack[-1])
@@ -775,6 +669,14 @@ class MoveEngine:
         del self.move_stack[-1]
         del self.reached_positions[-1]
 
+    def unwind(self,length:int):
+        """Undoes moves until the move stack is back to length moves, e.g. to restore the position after an aborted search"""
+        while len(self.move_stack) > length:
+            if len(self.null_stack) > 0 and self.null_stack[-1][2] == len(self.move_stack) - 1:
+                self.unmove_null()
+            else:
+                self.unmove()
+
 
     def set_fen(self,fen:str):
         """Sets board to specified FEN, resets history"""
@@ -785,6 +687,8 @@ class MoveEngine:
         self.board = board
         self.instruction_stack = []
         self.checkers_record = []
+        self.move_stack = []
+        self.null_stack = []
         self.reached_positions = [ChessHashing.hash(self.cache,board)]
         self.__update_checkers()
 
@@ -855,11 +759,10 @@ class MoveEngine:
             raise self.__legal_exception("Cannot get legal moves if legal mode is not enabled")
 
         pins = self.get_pins()
-        pinned_pos = [pin[0] for pin in pins]
         pseudo_moves = self.get_moves_pseudo_legal()
 
         for move in pseudo_moves:
-            if self.move_legal(move,pinned_pos,pins):
+            if self.move_legal(move,pins):
                 return True
 
         return False
@@ -979,6 +882,7 @@ class MoveEngine:
         self.instruction_stack = []
         self.checkers_record = []
         self.move_stack = []
+        self.null_stack = []
         self.reached_positions = [ChessHashing.hash(self.cache,self.board)]
 
         self.legal_mode = legal_mode
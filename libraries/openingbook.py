@@ -0,0 +1,158 @@
+import mmap
+import random
+import struct
+from dataclasses import dataclass
+from moveengine import *
+
+@dataclass
+class BookEntry:
+    """Single polyglot book entry http://hgm.nubati.net/book_format.html"""
+    key:int
+    raw_move:int
+    weight:int
+    learn:int
+
+class OpeningBook:
+    """
+    Polyglot opening book reader. \n
+    The book file is memory mapped once, entries are sorted by key so a position is found by binary search. \n
+    Books must be probed with polyglot hashes, MoveCache(polyglot_keys=True) makes MoveEngine.current_hash a polyglot hash
+    """
+
+    ENTRY_SIZE = 16
+    """Size in bytes of a polyglot entry"""
+
+    ENTRY_FORMAT = struct.Struct(">QHHI")
+    """key (uint64), move (uint16), weight (uint16), learn (uint32), big endian"""
+
+    KEY_FORMAT = struct.Struct(">Q")
+
+    PROMOTION_TYPES = {1:MoveType.PROMOTIONKNIGHT,2:MoveType.PROMOTIONBISHOP,3:MoveType.PROMOTIONROOK,4:MoveType.PROMOTIONQUEEN}
+    """Polyglot promotion piece -> our promotion move type"""
+
+    path:str = None
+
+    size:int = 0
+    """Number of entries in book"""
+
+    __file = None
+    __map:mmap.mmap = None
+
+    def __init__(self,path:str) -> None:
+        self.path = path
+        self.__file = open(path,"rb")
+        length = self.__file.seek(0,2)
+        self.size = length // self.ENTRY_SIZE
+        #mmap can not map an empty file
+        if self.size > 0:
+            self.__map = mmap.mmap(self.__file.fileno(),0,access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self.__map != None:
+            self.__map.close()
+            self.__map = None
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+    def __key_at(self,index:int)->int:
+        return self.KEY_FORMAT.unpack_from(self.__map,index*self.ENTRY_SIZE)[0]
+
+    def __lower_bound(self,key:int)->int:
+        """Index of first entry with key greater or equal to given key"""
+        low = 0
+        high = self.size
+        while low < high:
+            mid = (low + high) >> 1
+            if self.__key_at(mid) < key:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def entries(self,key:int)->list[BookEntry]:
+        """Returns all book entries with the given key"""
+        entries = []
+        if self.__map == None: return entries
+
+        index = self.__lower_bound(key)
+        while index < self.size:
+            entry = BookEntry(*self.ENTRY_FORMAT.unpack_from(self.__map,index*self.ENTRY_SIZE))
+            if entry.key != key: break
+            entries.append(entry)
+            index += 1
+        return entries
+
+    @staticmethod
+    def decode_pos(square:int)->int:
+        """Converts polyglot square (a1 = 0) to our board position (a8 = 0)"""
+        return square ^ 56
+
+    @staticmethod
+    def encode(move:Move)->int:
+        """Converts our move into polyglot move, castling is encoded as king takes own rook"""
+        pos_to = move.pos_to
+        if move.move_type == MoveType.CASTLERIGHT:
+            pos_to = move.pos_from + 3
+        elif move.move_type == MoveType.CASTLELEFT:
+            pos_to = move.pos_from - 4
+
+        raw_move = OpeningBook.decode_pos(pos_to) | (OpeningBook.decode_pos(move.pos_from) << 6)
+        for promotion, move_type in OpeningBook.PROMOTION_TYPES.items():
+            if move.move_type == move_type:
+                raw_move |= promotion << 12
+        return raw_move
+
+    def decode(self,move_engine:MoveEngine,raw_move:int)->Move:
+        """
+        Converts polyglot move into our move for the position of the move engine. \n
+        Only the moves of the piece on the origin square are generated. \n
+        Returns None if the move is not legal, this can happen on a key collision
+        """
+        pos_to = self.decode_pos(raw_move & 0x3F)
+        pos_from = self.decode_pos((raw_move >> 6) & 0x3F)
+        promotion = (raw_move >> 12) & 0x7
+
+        for move in move_engine.get_moves_pos(pos_from):
+            #Polyglot encodes castling as king takes own rook
+            if move.move_type in MoveType.CASTLES:
+                rook_pos = move.pos_from + 3 if move.move_type == MoveType.CASTLERIGHT else move.pos_from - 4
+                if pos_to == rook_pos: return move
+                continue
+            if move.pos_to != pos_to: continue
+            if move.move_type in MoveType.PROMOTIONS:
+                if self.PROMOTION_TYPES.get(promotion) == move.move_type: return move
+                continue
+            return move
+        return None
+
+    def find_all(self,move_engine:MoveEngine,key:int = None)->list[tuple[Move,int]]:
+        """
+        Returns all (move, weight) pairs for the current position of the move engine \n
+        key - polyglot hash of the position, defaults to the current hash of the move engine
+        """
+        key = move_engine.current_hash if key == None else key
+        output = []
+        for entry in self.entries(key):
+            move = self.decode(move_engine,entry.raw_move)
+            if move != None:
+                output.append((move,entry.weight))
+        return output
+
+    def weighted_choice(self,move_engine:MoveEngine,key:int = None,rng:random.Random = None)->Move:
+        """Selects a random book move distributed by weights, returns None if position is not in book"""
+        moves = [(move,weight) for move, weight in self.find_all(move_engine,key) if weight > 0]
+        if len(moves) == 0: return None
+
+        rng = random if rng == None else rng
+        return rng.choices([move for move, _ in moves],[weight for _, weight in moves])[0]
+
+    def best(self,move_engine:MoveEngine,key:int = None)->Move:
+        """Selects the book move with highest weight, returns None if position is not in book"""
+        moves = self.find_all(move_engine,key)
+        if len(moves) == 0: return None
+        return max(moves,key=lambda entry: entry[1])[0]
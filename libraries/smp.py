@@ -0,0 +1,218 @@
+import sys
+import time
+import logging
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool, RawValue
+from chessengine import *
+
+def _search_helper(engine:Engine,fen:str,reached_positions:list[int],helper:int,deadline:float)->tuple[int,int,str]:
+    """Searches position on a helper engine until deadline or stop flag, returns (depth reached, score, best move uci)"""
+    engine.move_engine.set_fen(fen)
+    #Positions reached before the root are needed for repetition draws
+    engine.move_engine.reached_positions = list(reached_positions)
+    #Half of the helpers search one ply deeper so threads spread over different depths
+    engine.depth_offset = helper % 2
+
+    score, move = engine.ponder(max(deadline - time.time(),0))
+    if move == None or move.null:
+        return (0,score,None)
+    return (engine.depth_reached,score,move.uci)
+
+def _create_helper(cache:MoveCache,table:TranspositionTable,stop_flag)->Engine:
+    engine = Engine(cache,MoveEngine(BoardIO.from_fen(FEN.START_POS),cache),table)
+    engine.smp_helper = True
+    engine.opening_book_mode = False
+    engine.stop_flag = stop_flag
+    #Only the main search reports depth and score, helper lines would flood the log and interleave with it
+    engine.log_search = False
+    return engine
+
+#Helper process state, set up once per process by _init_helper_process
+_helper_engine:Engine = None
+
+def _init_helper_process(polyglot_keys:bool,table:SharedTranspositionTable,stop_flag):
+    """Pool initializer, builds the helper's own cache and engine attached to the shared table"""
+    global _helper_engine
+    logging.disable(logging.INFO)
+    _helper_engine = _create_helper(MoveCache(polyglot_keys=polyglot_keys),table,stop_flag)
+
+def _search_helper_process(fen:str,reached_positions:list[int],helper:int,deadline:float)->tuple[int,int,str]:
+    return _search_helper(_helper_engine,fen,reached_positions,helper,deadline)
+
+class ParallelSearch(ABC):
+    """
+    Lazy SMP parallel search https://www.chessprogramming.org/Lazy_SMP \n
+    Helpers search the same root as the main engine with slightly different depths, sharing a transposition table.
+    Positions found by one helper are read by the others, so the main search reaches a given depth sooner. \n
+    The best move of the deepest completed iteration over all searches is played
+    """
+
+    threads:int = 1
+    """Total searches, including the main engine"""
+
+    table:LocklessTranspositionTable = None
+    """Table shared by all searches, the main engine must search with this table"""
+
+    _stop_flag = None
+
+    @abstractmethod
+    def _start_helper(self,fen:str,reached_positions:list[int],helper:int,deadline:float):
+        """Starts helper search, returns object whose result() gives the helper's search result"""
+        pass
+
+    @abstractmethod
+    def close(self):
+        """Stops helpers and frees shared table"""
+        pass
+
+    def __start_helpers(self,move_engine:MoveEngine,deadline:float)->list:
+        self._stop_flag.value = 0
+        fen = BoardIO.get_fen(move_engine.board)
+        return [self._start_helper(fen,move_engine.reached_positions,helper,deadline) for helper in range(1,self.threads)]
+
+    def __collect(self,move_engine:MoveEngine,helpers:list,depth:int,score:int,move:Move)->tuple[int,Move]:
+        """Stops helpers and returns the result of the deepest completed iteration, main engine wins ties"""
+        self._stop_flag.value = 1
+        moves = None
+        for helper in helpers:
+            helper_depth, helper_score, helper_uci = helper.result()
+            if helper_depth <= depth or helper_uci == None: continue
+            moves = move_engine.get_moves() if moves == None else moves
+            helper_move = next((move for move in moves if move.uci == helper_uci),None)
+            if helper_move != None:
+                depth, score, move = helper_depth, helper_score, helper_move
+        return (score,move)
+
+    def ponder(self,engine:Engine,time_ponder:float = None,time_left:float = None,increment:float = 0,moves_to_go:int = None)->tuple[int,Move]:
+        """Searches engine's position with all threads, arguments are those of Engine.ponder"""
+        assert engine.transposition_table is self.table
+        soft, hard = TimeManager.limits(time_ponder,time_left,increment,moves_to_go)
+
+        #No need to start helpers for book moves
+        opening_move = engine.attempt_opening_book_read()
+        if opening_move != None:
+            return (0,opening_move)
+
+        #Generation is advanced before helpers start so their first entries belong to this search
+        self.table.new_search()
+
+        #Helpers run until the main search is done, at the latest until its hard limit
+        helpers = self.__start_helpers(engine.move_engine,time.time() + hard)
+        #Book was probed and generation advanced above, the main search does neither again
+        opening_book_mode, smp_helper = engine.opening_book_mode, engine.smp_helper
+        engine.opening_book_mode = False
+        engine.smp_helper = True
+        try:
+            score, move = engine.ponder(time_ponder,time_left,increment,moves_to_go)
+        finally:
+            engine.opening_book_mode = opening_book_mode
+            engine.smp_helper = smp_helper
+        return self.__collect(engine.move_engine,helpers,engine.depth_reached,score,move)
+
+    def search_depth(self,engine:Engine,depth:int)->tuple[int,Move]:
+        """Iterative deepening to fixed depth on the main engine while helpers search, used to measure time to depth"""
+        assert engine.transposition_table is self.table
+        self.table.new_search()
+
+        helpers = self.__start_helpers(engine.move_engine,float("inf"))
+        for i in range(1,depth + 1):
+            score, move = engine.search_tree(i)
+        return self.__collect(engine.move_engine,helpers,depth,score,move)
+
+class LazySMP(ParallelSearch):
+    """Parallel search with helper processes attached to a table in shared memory"""
+
+    __pool:Pool = None
+
+    class _AsyncResult:
+        """Gives pool results the same result() interface as futures"""
+        def __init__(self,result) -> None:
+            self.result = result.get
+
+    def __init__(self,cache:MoveCache,threads:int,hash_mb:int = Engine.hash_mb) -> None:
+        self.threads = threads
+        self.table = SharedTranspositionTable(hash_mb,cache)
+        self._stop_flag = RawValue("b",0)
+        self.__pool = Pool(threads - 1,initializer=_init_helper_process,initargs=(cache.polyglot_keys,self.table,self._stop_flag))
+
+    def _start_helper(self,fen:str,reached_positions:list[int],helper:int,deadline:float):
+        return LazySMP._AsyncResult(self.__pool.apply_async(_search_helper_process,(fen,reached_positions,helper,deadline)))
+
+    def close(self):
+        self.__pool.terminate()
+        self.__pool.join()
+        self.table.close()
+        self.table.unlink()
+
+class ThreadedSMP(ParallelSearch):
+    """
+    Parallel search with helper threads sharing an in process lockless table and the move cache. \n
+    There is no process start up or copying between processes, but threads only run in parallel on free threaded (no GIL) python
+    """
+
+    __executor:ThreadPoolExecutor = None
+    __engines:list[Engine] = None
+
+    def __init__(self,cache:MoveCache,threads:int,hash_mb:int = Engine.hash_mb) -> None:
+        self.threads = threads
+        self.table = LocklessTranspositionTable(hash_mb,cache)
+        self._stop_flag = RawValue("b",0)
+        self.__engines = [_create_helper(cache,self.table,self._stop_flag) for _ in range(threads - 1)]
+        self.__executor = ThreadPoolExecutor(threads - 1)
+
+    @staticmethod
+    def free_threaded()->bool:
+        """True if the interpreter runs without the GIL"""
+        return hasattr(sys,"_is_gil_enabled") and not sys._is_gil_enabled()
+
+    def _start_helper(self,fen:str,reached_positions:list[int],helper:int,deadline:float):
+        return self.__executor.submit(_search_helper,self.__engines[helper - 1],fen,reached_positions,helper,deadline)
+
+    def close(self):
+        self._stop_flag.value = 1
+        self.__executor.shutdown()
+
+def create_parallel_search(cache:MoveCache,threads:int,hash_mb:int = Engine.hash_mb)->ParallelSearch:
+    """Threads when python is free threaded, processes otherwise"""
+    if ThreadedSMP.free_threaded():
+        return ThreadedSMP(cache,threads,hash_mb)
+    return LazySMP(cache,threads,hash_mb)
+
+
+def benchmark(depth:int = 4,threads:int = 4,positions:list[str] = None,parallel:type = LazySMP):
+    """Compares time to depth of the single process engine and parallel search on the FEN.POS_* positions"""
+    logging.disable(logging.INFO)
+    positions = [FEN.POS_2,FEN.POS_3,FEN.POS_4,FEN.POS_5,FEN.POS_6] if positions == None else positions
+    cache = MoveCache()
+    search = parallel(cache,threads)
+    total_single = 0
+    total_parallel = 0
+    try:
+        for fen in positions:
+            me = MoveEngine(BoardIO.from_fen(fen),cache)
+
+            engine = Engine(cache,me,TranspositionTable(Engine.hash_mb))
+            t1 = time.perf_counter()
+            for i in range(1,depth + 1):
+                score_single, move_single = engine.search_tree(i)
+            t_single = time.perf_counter() - t1
+
+            search.table.clear()
+            engine = Engine(cache,me,search.table)
+            t1 = time.perf_counter()
+            score, move = search.search_depth(engine,depth)
+            t_parallel = time.perf_counter() - t1
+
+            total_single += t_single
+            total_parallel += t_parallel
+            print(f"{fen}\n  1 thread: {t_single:.2f}s {move_single.uci} ({score_single})  {threads} threads: {t_parallel:.2f}s {move.uci} ({score})  speedup {t_single / t_parallel:.2f}")
+        print(f"Total 1 thread: {total_single:.2f}s {threads} threads: {total_parallel:.2f}s speedup {total_single / total_parallel:.2f}")
+    finally:
+        search.close()
+
+
+if __name__ == '__main__':
+    #python smp.py [depth] [threads] [processes|threads]
+    parallel = ThreadedSMP if len(sys.argv) > 3 and sys.argv[3] == "threads" else LazySMP
+    benchmark(*[int(arg) for arg in sys.argv[1:3]],parallel=parallel)
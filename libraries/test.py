@@ -1,6 +1,13 @@
 from asyncio.log import logger
 from unittest import suite
 from moveengine import *
+from openingbook import *
+from bookbuilder import *
+from transposition import *
+from timemanager import *
+import os
+import shutil
+import tempfile
 import time
 import unittest
 from multiprocessing import Process
@@ -122,6 +129,288 @@ class TestPos6(TestPermute):
         self.fen_test(FEN.POS_6,4,3894594,name)
         self.fen_test(FEN.POS_6,5,164075551,name)
 
+class TestStaticExchange(unittest.TestCase):
+    """Static exchange evaluation, first two positions from chessprogramming.org/SEE_-_The_Swap_Algorithm"""
+
+    cache = None
+
+    def see(self,fen:str,uci:str)->int:
+        me = MoveEngine(BoardIO.from_fen(fen),self.cache)
+        move = [move for move in me.get_moves() if move.uci == uci][0]
+        return me.see(move)
+
+    def setUp(self) -> None:
+        self.cache = MoveCache()
+        return super().setUp()
+
+    def runTest(self):
+        #Rook takes undefended pawn
+        self.assertEqual(self.see("1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1","e1e5"),100)
+        #Knight takes pawn, x-ray attackers on both sides
+        self.assertEqual(self.see("1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1","d3e5"),-220)
+        #Rook takes defended pawn, second rook recaptures
+        self.assertEqual(self.see("4k3/8/2p5/3p4/8/8/3R4/3RK3 w - - 0 1","d2d5"),-300)
+
+
+class TestHashing(unittest.TestCase):
+    """Zobrist keys are deterministic and incremental hashes match full hashes"""
+
+    def runTest(self):
+        cache1 = MoveCache()
+        cache2 = MoveCache()
+
+        #Keys must be identical for every cache so hashes can be shared
+        self.assertEqual(cache1.hash_key_version,cache2.hash_key_version)
+        self.assertEqual(cache1.get_hash_keys(),cache2.get_hash_keys())
+
+        #Incremental hashes must match full hashes
+        me = MoveEngine(BoardIO.from_fen(FEN.POS_2),cache1)
+        me.debug_hash = True
+        me.perft(2)
+        self.assertEqual(me.current_hash,ChessHashing.hash(cache2,BoardIO.from_fen(FEN.POS_2)))
+
+class TestNullMove(unittest.TestCase):
+    """Null moves made and undone by null move pruning"""
+
+    def runTest(self):
+        #Null moves only change side to move and enpassant target
+        polyglot = MoveCache(polyglot_keys=True)
+        me = MoveEngine(BoardIO.from_fen("rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3"),polyglot)
+        me.allow_null = True
+        start_hash = me.current_hash
+        me.move_null()
+        self.assertEqual(me.current_hash,ChessHashing.hash(polyglot,me.board))
+        me.unmove_null()
+        self.assertEqual(me.current_hash,start_hash)
+        self.assertEqual(len(me.null_stack),0)
+
+class TestUnwind(unittest.TestCase):
+    """Searches stopped in the tree unwind the move engine they search in place"""
+
+    def runTest(self):
+        #Unwinding a mix of moves and null moves restores the position
+        me = MoveEngine(BoardIO.from_fen("rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3"),MoveCache(polyglot_keys=True))
+        me.allow_null = True
+        start_hash = me.current_hash
+        fen = BoardIO.get_fen(me.board)
+        me.move(me.get_moves()[0])
+        me.move_null()
+        me.move(me.get_moves()[0])
+        me.unwind(0)
+        self.assertEqual(me.current_hash,start_hash)
+        self.assertEqual(BoardIO.get_fen(me.board),fen)
+        self.assertEqual(len(me.null_stack),0)
+
+class TestPolyglotKeys(unittest.TestCase):
+    """Polyglot key mode hashes positions like opening books do"""
+
+    def runTest(self):
+        #Polyglot keys must reproduce the published polyglot hashes
+        polyglot = MoveCache(polyglot_keys=True)
+        self.assertEqual(ChessHashing.hash(polyglot,BoardIO.from_fen(FEN.START_POS)),0x463b96181691fc9c)
+        self.assertEqual(ChessHashing.hash(polyglot,BoardIO.from_fen("rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3")),0x22a48b5a8e47ff78)
+
+class TestOpeningBook(unittest.TestCase):
+    """Polyglot book reader tests against the bundled book"""
+
+    def runTest(self):
+        cache = MoveCache(polyglot_keys=True)
+        me = MoveEngine(BoardIO.from_fen(FEN.START_POS),cache)
+        with OpeningBook("opening/baron30.bin") as book:
+            moves = book.find_all(me)
+            self.assertTrue(len(moves) > 0)
+            #Every book move must be a legal move of the position
+            legal = [move.uci for move in me.get_moves()]
+            for move, weight in moves:
+                self.assertIn(move.uci,legal)
+            self.assertIn(book.weighted_choice(me).uci,legal)
+            self.assertEqual(book.best(me).uci,max(moves,key=lambda entry: entry[1])[0].uci)
+
+            #Position not in book
+            me.set_fen(FEN.POS_4)
+            self.assertEqual(book.find_all(me),[])
+            self.assertIsNone(book.best(me))
+
+class TestTranspositionTable(unittest.TestCase):
+    """Fixed size transposition table replacement policy"""
+
+    def runTest(self):
+        cache = MoveCache()
+        self.check(TranspositionTable(1))
+        self.check(LocklessTranspositionTable(1,cache))
+
+        shared = SharedTranspositionTable(1,cache)
+        try:
+            self.check(shared)
+            #Entries are visible to tables attached by name
+            attached = SharedTranspositionTable(1,cache,shared.name)
+            shared.store(7,3,-40,TranspositionTable.BOUND_EXACT,None)
+            self.assertEqual(attached.probe(7),(3,-40,TranspositionTable.BOUND_EXACT,TranspositionTable.MOVE_NONE))
+            attached.close()
+            #Tables can only be shared between caches with the same zobrist keys
+            with self.assertRaises(ValueError):
+                SharedTranspositionTable(1,MoveCache(polyglot_keys=True),shared.name)
+        finally:
+            shared.close()
+            shared.unlink()
+
+    def check(self,table:TranspositionTable):
+        move = MoveEngine(BoardIO.from_fen(FEN.START_POS),MoveCache()).get_moves()[0]
+        #Keys in the same bucket
+        key1 = 5
+        key2 = 5 + table.buckets
+        key3 = 5 + 2 * table.buckets
+
+        table.store(key1,4,100,TranspositionTable.BOUND_LOWER,move)
+        self.assertEqual(table.probe(key1),(4,100,TranspositionTable.BOUND_LOWER,TranspositionTable.pack_move(move)))
+        self.assertIsNone(table.probe(key2))
+
+        #Shallower entry goes to always replace slot, deeper entry stays
+        table.store(key2,2,50,TranspositionTable.BOUND_UPPER,None)
+        table.store(key3,1,25,TranspositionTable.BOUND_UPPER,None)
+        self.assertIsNotNone(table.probe(key1))
+        self.assertIsNone(table.probe(key2))
+        self.assertEqual(table.probe(key3)[1],25)
+
+        #Same position without a move keeps best move
+        table.store(key1,6,120,TranspositionTable.BOUND_UPPER,None)
+        self.assertEqual(table.probe(key1)[3],TranspositionTable.pack_move(move))
+
+        #Entries of older searches are replaced
+        table.new_search()
+        table.store(key2,0,10,TranspositionTable.BOUND_UPPER,None)
+        self.assertIsNone(table.probe(key1))
+        self.assertEqual(table.probe(key2)[0],0)
+
+class TestTimeManager(unittest.TestCase):
+    """Soft and hard limits of fixed time and clocks"""
+
+    def runTest(self):
+        self.assertEqual(TimeManager.limits(2),(2,2))
+
+        #Hard limit lets the current iteration finish but stays well inside the clock
+        soft, hard = TimeManager.limits(None,60,1)
+        self.assertLess(soft,hard)
+        self.assertLessEqual(hard,60 * TimeManager.MAX_TIME_USED)
+
+        #Few moves to go spends more of the clock, the last move may use all of it
+        self.assertGreater(TimeManager.limits(None,60,0,5)[0],TimeManager.limits(None,60,0,20)[0])
+        self.assertLessEqual(TimeManager.limits(None,1,0,1)[1],1 - TimeManager.MOVE_OVERHEAD + 1e-9)
+
+        #Nearly empty clock still leaves time to finish the first iterations
+        soft, hard = TimeManager.limits(None,0.06,0,30)
+        self.assertGreaterEqual(soft,TimeManager.MIN_TIME)
+        self.assertLessEqual(soft,hard)
+
+        #A search without fixed time or clock has no limits to stop at
+        with self.assertRaises(ValueError):
+            TimeManager.limits()
+
+        manager = TimeManager()
+        with self.assertRaises(ValueError):
+            manager.start()
+        manager.start(0)
+        time.sleep(0.01)
+        self.assertTrue(manager.soft_stop())
+        self.assertTrue(manager.poll())
+
+        #chessengine imports this module, it can only be imported once it is loaded
+        from chessengine import Engine
+        with self.assertRaises(ValueError):
+            Engine(MoveCache()).ponder()
+
+class TestMateScores(unittest.TestCase):
+    """Checkmates are scored by distance from the root"""
+
+    def runTest(self):
+        #chessengine imports this module, it can only be imported once it is loaded
+        from chessengine import Engine
+        from evaluation import Evaluation
+
+        #Back rank mate, the mated side (black) has more material and centralized knights so its static evaluation is positive
+        cache = MoveCache()
+        me = MoveEngine(BoardIO.from_fen("6k1/5ppp/8/3nn3/8/8/5PPP/R5K1 w - - 0 1"),cache)
+        self.assertLess(Evaluation.eval_positions_basic(me,False),0)
+
+        #Checkmate found at the horizon is a mate one ply from the root
+        engine = Engine(cache,me)
+        score, move = engine.search_tree(1)
+        self.assertEqual(move.uci,"a1a8")
+        self.assertEqual(score,engine.mate_score(1))
+
+class TestParallelSearch(unittest.TestCase):
+    """Helper engines are reused for every search"""
+
+    def runTest(self):
+        #chessengine imports this module, smp can only be imported once it is loaded
+        import smp
+
+        #Parallel searches must implement starting helpers and closing
+        with self.assertRaises(TypeError):
+            smp.ParallelSearch()
+
+        cache = MoveCache()
+        helper = smp._create_helper(cache,TranspositionTable(1),smp.RawValue("b",0))
+        me = helper.move_engine
+        for _ in range(4):
+            me.move(me.get_moves()[0])
+
+        #A new search starts without the moves of the previous game, they would give move ordering wrong context
+        reached_positions = [ChessHashing.hash(cache,BoardIO.from_fen(FEN.POS_3))]
+        depth, score, uci = smp._search_helper(helper,FEN.POS_3,reached_positions,1,time.time() + 0.2)
+        self.assertEqual(len(me.move_stack),0)
+        self.assertIsNotNone(uci)
+
+class TestBookBuilder(unittest.TestCase):
+    """Builds a book from a small PGN and reads it back"""
+
+    PGN = """[Event "Test"]
+[Result "1-0"]
+
+1. e4 {comment (not a move)} e5 (1... c5 2. Nf3) 2. Nf3 Nc6 3. Bb5 a6 4. O-O $1 Nf6 1-0
+
+[Event "Test"]
+[Result "1/2-1/2"]
+
+1. e4 c5 2. Nf3 1/2-1/2
+"""
+
+    def runTest(self):
+        directory = tempfile.mkdtemp()
+        try:
+            pgn = os.path.join(directory,"games.pgn")
+            output = os.path.join(directory,"book.bin")
+            with open(pgn,"w") as file:
+                file.write(self.PGN)
+
+            games = list(PGNReader.games(pgn))
+            self.assertEqual(len(games),2)
+            self.assertEqual(games[0][1],["e4","e5","Nf3","Nc6","Bb5","a6","O-O","Nf6"])
+
+            BookBuilder(processes=1).build([pgn],output)
+
+            me = MoveEngine(BoardIO.from_fen(FEN.START_POS),MoveCache(polyglot_keys=True))
+            with OpeningBook(output) as book:
+                #e4 won once and drew once
+                self.assertEqual([(move.uci,weight) for move, weight in book.find_all(me)],[("e2e4",3)])
+                for san in games[0][1][:6]:
+                    me.move(PGNReader.san_to_move(me,san))
+                self.assertEqual(book.best(me).move_type,MoveType.CASTLERIGHT)
+
+            #A worker replays every game on one engine, moves left behind by a game would change the positions of the next one
+            with open(pgn,"w") as file:
+                file.write(self.PGN + "\n" + self.PGN)
+            BookBuilder(processes=1).build([pgn],output)
+
+            me = MoveEngine(BoardIO.from_fen(FEN.START_POS),MoveCache(polyglot_keys=True))
+            with OpeningBook(output) as book:
+                #Every position of the repeated games has twice the weight
+                self.assertEqual([(move.uci,weight) for move, weight in book.find_all(me)],[("e2e4",6)])
+                for san in games[0][1][:6]:
+                    me.move(PGNReader.san_to_move(me,san))
+                self.assertEqual([(move.move_type,weight) for move, weight in book.find_all(me)],[(MoveType.CASTLERIGHT,2 * BookBuilder.WEIGHT_WIN)])
+        finally:
+            shutil.rmtree(directory)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,77 @@
+import time
+
+class TimeManager:
+    """
+    Decides how long a search may run https://www.chessprogramming.org/Time_Management \n
+    Soft limit - no new iteration is started once it has passed, the last completed iteration would likely not finish. \n
+    Hard limit - the search is aborted, the best move of the partially searched iteration is kept. \n
+    The clock is only read every POLL_NODES nodes, reading it on every node costs more than the overshoot it saves
+    """
+
+    POLL_NODES:int = 256
+    """Nodes searched between reads of the clock"""
+
+    DEFAULT_MOVES_TO_GO:int = 30
+    """Moves the remaining time is spread over if the clock does not give moves to go"""
+    INCREMENT_USED:float = 0.75
+    """Part of the increment spent on every move"""
+    HARD_RATIO:float = 4
+    """Hard limit is this many soft limits, lets an iteration that is already running finish"""
+    MAX_TIME_USED:float = 0.5
+    """Hard limit never spends more than this part of the time left on the clock"""
+    MOVE_OVERHEAD:float = 0.05
+    """Seconds kept back for making the move and communication with the gui"""
+    MIN_TIME:float = 0.01
+
+    soft_limit:float = 0
+    hard_limit:float = 0
+    t_start:float = 0
+
+    stop_flag = None
+    """Shared flag (e.g. multiprocessing.RawValue), search stops when its value is set"""
+
+    stopped:bool = False
+    """Set once the hard limit passed or the stop flag was seen"""
+
+    @staticmethod
+    def limits(time_ponder:float = None,time_left:float = None,increment:float = 0,moves_to_go:int = None)->tuple[float,float]:
+        """
+        Returns (soft limit, hard limit) in seconds \n
+        time_ponder - fixed time for the move, the whole time may be used \n
+        time_left, increment, moves_to_go - clock of the side to move, used instead of time_ponder if time_left is given \n
+        Raises ValueError if neither time_ponder nor time_left is given
+        """
+        if time_ponder == None and time_left == None:
+            raise ValueError("Search needs a time budget, give time_ponder or time_left")
+        if time_left == None:
+            return (time_ponder,time_ponder)
+
+        moves_to_go = moves_to_go if moves_to_go != None and moves_to_go > 0 else TimeManager.DEFAULT_MOVES_TO_GO
+        available = max(time_left - TimeManager.MOVE_OVERHEAD,TimeManager.MIN_TIME)
+        hard = max(available * TimeManager.MAX_TIME_USED,TimeManager.MIN_TIME)
+        #With one move to go the move may use everything left on the clock
+        if moves_to_go == 1:
+            hard = available
+        soft = max(min(available / moves_to_go + increment * TimeManager.INCREMENT_USED,hard),TimeManager.MIN_TIME)
+        hard = min(soft * TimeManager.HARD_RATIO,hard)
+        return (soft,hard)
+
+    def start(self,time_ponder:float = None,time_left:float = None,increment:float = 0,moves_to_go:int = None):
+        """Starts timing a search, see limits for arguments"""
+        self.soft_limit, self.hard_limit = self.limits(time_ponder,time_left,increment,moves_to_go)
+        self.t_start = time.time()
+        self.stopped = False
+
+    @property
+    def elapsed(self)->float:
+        return time.time() - self.t_start
+
+    def poll(self)->bool:
+        """Reads clock and stop flag, true if the search has to be aborted"""
+        if self.elapsed > self.hard_limit or (self.stop_flag != None and self.stop_flag.value):
+            self.stopped = True
+        return self.stopped
+
+    def soft_stop(self)->bool:
+        """True if no new iteration should be started"""
+        return self.stopped or self.elapsed > self.soft_limit or (self.stop_flag != None and self.stop_flag.value)
@@ -0,0 +1,302 @@
+import zlib
+from array import array
+from multiprocessing import shared_memory
+from moveengine import *
+
+class TranspositionTable:
+    """
+    Fixed size transposition table https://www.chessprogramming.org/Transposition_Table \n
+    Entries are stored in flat arrays, memory is allocated once from the size in MB. \n
+    The table is split into buckets of two slots, a position hashes to exactly one bucket. \n
+    Slot 0 is depth preferred - only replaced by deeper searches or entries from an older generation. \n
+    Slot 1 is always replaced
+    """
+
+    BOUND_NONE = 0
+    """Empty slot"""
+    BOUND_EXACT = 1
+    """Score is exact"""
+    BOUND_LOWER = 2
+    """Search failed high, score is a lower bound"""
+    BOUND_UPPER = 3
+    """Search failed low, score is an upper bound"""
+
+    BUCKET_SIZE = 2
+
+    ENTRY_BYTES = 17
+    """key (8) + score (4) + depth (1) + bound (1) + move (2) + age (1)"""
+
+    MOVE_NONE = 0
+
+    size_mb:int = 0
+
+    buckets:int = 0
+    """Number of buckets, power of two so bucket index is key & mask"""
+
+    generation:int = 0
+    """Current search generation, entries of older generations are replaced first"""
+
+    __mask:int = 0
+
+    keys:array = None
+    scores:array = None
+    depths:array = None
+    bounds:array = None
+    moves:array = None
+    ages:array = None
+
+    def __init__(self,size_mb:int = 16) -> None:
+        self.size_mb = size_mb
+        #Largest power of two bucket count that fits in the requested size
+        max_buckets = max((size_mb << 20) // (self.ENTRY_BYTES * self.BUCKET_SIZE),1)
+        self.buckets = 1 << (max_buckets.bit_length() - 1)
+        self.__mask = self.buckets - 1
+        self.clear()
+
+    def clear(self):
+        """Empties table"""
+        entries = self.buckets * self.BUCKET_SIZE
+        self.keys = array("Q",[0]) * entries
+        self.scores = array("i",[0]) * entries
+        self.depths = array("b",[0]) * entries
+        self.bounds = array("B",[self.BOUND_NONE]) * entries
+        self.moves = array("H",[self.MOVE_NONE]) * entries
+        self.ages = array("B",[0]) * entries
+        self.generation = 0
+
+    def new_search(self):
+        """Advances generation, entries of previous searches become replaceable but can still be read"""
+        self.generation = (self.generation + 1) & 0xFF
+
+    @staticmethod
+    def pack_move(move:Move)->int:
+        """Packs move into 16 bits, from | to << 6 | move type << 12. Null move packs to MOVE_NONE"""
+        if move == None or move.null: return TranspositionTable.MOVE_NONE
+        return move.pos_from | (move.pos_to << 6) | (move.move_type << 12)
+
+    def probe(self,key:int)->tuple[int,int,int,int]:
+        """Returns (depth, score, bound, packed move) of the entry for key, None if position is not in table"""
+        index = (key & self.__mask) * self.BUCKET_SIZE
+        keys = self.keys
+        if keys[index] != key or self.bounds[index] == self.BOUND_NONE:
+            index += 1
+            if keys[index] != key or self.bounds[index] == self.BOUND_NONE:
+                return None
+        return (self.depths[index],self.scores[index],self.bounds[index],self.moves[index])
+
+    def store(self,key:int,depth:int,score:int,bound:int,move:Move):
+        """Stores search result, the best move of an earlier search is kept if no move is given"""
+        index = (key & self.__mask) * self.BUCKET_SIZE
+        packed = self.pack_move(move)
+
+        #Depth preferred slot is replaced by the same position, deeper searches or entries from older searches
+        if not (self.keys[index] == key or self.bounds[index] == self.BOUND_NONE or self.ages[index] != self.generation or depth >= self.depths[index]):
+            #Always replace slot
+            index += 1
+
+        if packed == self.MOVE_NONE and self.keys[index] == key:
+            packed = self.moves[index]
+
+        self.keys[index] = key
+        self.scores[index] = score
+        self.depths[index] = depth
+        self.bounds[index] = bound
+        self.moves[index] = packed
+        self.ages[index] = self.generation
+
+    def hashfull(self)->int:
+        """Permille of the first 1000 slots used by the current generation"""
+        sample = min(1000,len(self.keys))
+        used = sum(1 for index in range(sample) if self.bounds[index] != self.BOUND_NONE and self.ages[index] == self.generation)
+        return used * 1000 // sample
+
+
+class LocklessTranspositionTable(TranspositionTable):
+    """
+    Transposition table stored in a flat buffer of 64 bit words so it can live in memory shared between processes. \n
+    Every slot is two words, data and key XOR data. A probe only accepts a slot if key XOR data matches,
+    so an entry torn by two processes writing at once reads as a miss and no locks are needed
+    https://www.chessprogramming.org/Shared_Hash_Table#Lockless \n
+    Data word - score (32) | depth (8) | bound (2) | move (16) | age (6)
+    """
+
+    HEADER_WORDS = 4
+    """magic, zobrist key set checksum, bucket count, generation"""
+
+    MAGIC = int.from_bytes(b"PYCHESTT","little")
+    WORDS_PER_SLOT = 2
+    """Bucket of two slots is four words, bucket index is shifted by 2 to get word index"""
+    AGE_MASK = 0x3F
+
+    SCORE_OFFSET = 1 << 31
+    """Scores are stored offset so they are unsigned, this also keeps data of a used slot non zero"""
+
+    key_set:int = 0
+    """Checksum of zobrist key set used to hash positions stored in the table"""
+
+    __mask:int = 0
+    __words:memoryview = None
+
+    def __init__(self,size_mb:int,cache:MoveCache,buffer = None,attach:bool = False) -> None:
+        """
+        size_mb - size of table \n
+        cache - move cache whose zobrist keys are used to hash positions stored in table \n
+        buffer - zeroed writable buffer of at least buffer_size(size_mb) bytes, allocated if None \n
+        attach - buffer already holds a table, attach to it instead of creating a new one
+        """
+        self.size_mb = size_mb
+        self.key_set = self.get_key_set(cache)
+        if buffer == None:
+            buffer = bytearray(self.buffer_size(size_mb))
+        self._attach(buffer,attach)
+
+    @staticmethod
+    def get_key_set(cache:MoveCache)->int:
+        return zlib.crc32(cache.hash_key_version.encode())
+
+    def _attach(self,buffer,attach:bool):
+        """Views buffer as table, writes header if not attaching to an existing table"""
+        size = len(buffer) - len(buffer) % 8
+        self.__words = memoryview(buffer)[:size].cast("Q")
+        words = self.__words
+        if attach:
+            error = None
+            if words[0] != self.MAGIC:
+                error = "Buffer does not hold a transposition table"
+            elif words[1] != self.key_set:
+                error = "Transposition table was created with a different zobrist key set"
+            if error != None:
+                self.release()
+                raise ValueError(error)
+        else:
+            words[0] = self.MAGIC
+            words[1] = self.key_set
+            words[2] = self.buckets_for_size(self.size_mb)
+            words[3] = 0
+        self.buckets = words[2]
+        self.__mask = self.buckets - 1
+
+    @staticmethod
+    def buckets_for_size(size_mb:int)->int:
+        """Largest power of two bucket count that fits in the requested size"""
+        bucket_bytes = LocklessTranspositionTable.WORDS_PER_SLOT * 8 * TranspositionTable.BUCKET_SIZE
+        max_buckets = max(((size_mb << 20) - LocklessTranspositionTable.HEADER_WORDS * 8) // bucket_bytes,1)
+        return 1 << (max_buckets.bit_length() - 1)
+
+    @staticmethod
+    def buffer_size(size_mb:int)->int:
+        """Bytes needed for table of given size"""
+        buckets = LocklessTranspositionTable.buckets_for_size(size_mb)
+        return (LocklessTranspositionTable.HEADER_WORDS + buckets * TranspositionTable.BUCKET_SIZE * LocklessTranspositionTable.WORDS_PER_SLOT) * 8
+
+    @property
+    def generation(self)->int:
+        return self.__words[3]
+
+    def clear(self):
+        words = self.__words
+        memoryview(words).cast("B")[self.HEADER_WORDS * 8:] = bytes((len(words) - self.HEADER_WORDS) * 8)
+        words[3] = 0
+
+    def new_search(self):
+        self.__words[3] = (self.__words[3] + 1) & self.AGE_MASK
+
+    def release(self):
+        """Releases view of buffer, required before shared memory can be closed"""
+        if self.__words != None:
+            self.__words.release()
+            self.__words = None
+
+    def probe(self,key:int)->tuple[int,int,int,int]:
+        words = self.__words
+        index = self.HEADER_WORDS + ((key & self.__mask) << 2)
+        data = words[index]
+        if data == 0 or words[index + 1] ^ data != key:
+            data = words[index + 2]
+            if data == 0 or words[index + 3] ^ data != key:
+                return None
+        return ((data >> 32) & 0xFF,(data & 0xFFFFFFFF) - self.SCORE_OFFSET,(data >> 40) & 0x3,(data >> 42) & 0xFFFF)
+
+    def store(self,key:int,depth:int,score:int,bound:int,move:Move):
+        words = self.__words
+        index = self.HEADER_WORDS + ((key & self.__mask) << 2)
+        packed = self.pack_move(move)
+        generation = words[3]
+
+        #Depth preferred slot is replaced by the same position, deeper searches or entries from older searches
+        data = words[index]
+        same = data != 0 and words[index + 1] ^ data == key
+        if not (same or data == 0 or (data >> 58) != generation or depth >= ((data >> 32) & 0xFF)):
+            #Always replace slot
+            index += self.WORDS_PER_SLOT
+            data = words[index]
+            same = data != 0 and words[index + 1] ^ data == key
+
+        if packed == self.MOVE_NONE and same:
+            packed = (data >> 42) & 0xFFFF
+
+        data = (score + self.SCORE_OFFSET) | (depth << 32) | (bound << 40) | (packed << 42) | (generation << 58)
+        words[index] = data
+        words[index + 1] = key ^ data
+
+    def hashfull(self)->int:
+        words = self.__words
+        generation = words[3]
+        sample = min(1000,self.buckets * TranspositionTable.BUCKET_SIZE)
+        used = 0
+        for slot in range(sample):
+            data = words[self.HEADER_WORDS + slot * self.WORDS_PER_SLOT]
+            if data != 0 and (data >> 58) == generation:
+                used += 1
+        return used * 1000 // sample
+
+class SharedTranspositionTable(LocklessTranspositionTable):
+    """
+    Lockless transposition table in shared memory, any number of processes can attach to it by name. \n
+    Pickling the table (e.g. passing it to a Process) attaches the other process to the same memory. \n
+    Positions are only shared correctly between processes using the same zobrist key set, this is checked on attach. \n
+    The process that created the table should call unlink once all processes are done with it
+    """
+
+    name:str = None
+
+    __memory:shared_memory.SharedMemory = None
+
+    def __init__(self,size_mb:int,cache:MoveCache,name:str = None) -> None:
+        """
+        size_mb - size of table \n
+        cache - move cache whose zobrist keys are used to hash positions \n
+        name - name of existing table to attach to, a new table is created if None
+        """
+        self.size_mb = size_mb
+        self.key_set = self.get_key_set(cache)
+        self.__open(name)
+
+    def __open(self,name:str):
+        if name == None:
+            #New shared memory is zero filled
+            self.__memory = shared_memory.SharedMemory(create=True,size=self.buffer_size(self.size_mb))
+        else:
+            self.__memory = shared_memory.SharedMemory(name=name)
+        self.name = self.__memory.name
+        try:
+            self._attach(self.__memory.buf,name != None)
+        except ValueError:
+            self.close()
+            raise
+
+    def __getstate__(self):
+        return (self.size_mb,self.key_set,self.name)
+
+    def __setstate__(self,state):
+        self.size_mb, self.key_set, name = state
+        self.__open(name)
+
+    def close(self):
+        """Detaches this process from the table"""
+        self.release()
+        self.__memory.close()
+
+    def unlink(self):
+        """Frees shared memory, call once from the creating process after every process has closed the table"""
+        self.__memory.unlink()